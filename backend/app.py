@@ -1,48 +1,106 @@
-from flask import Flask, request, send_file, jsonify
-import tempfile, os, pandas as pd
+from flask import Flask, request, send_file, jsonify, Response, g, stream_with_context
+import tempfile, os
+import asyncio
+import collections
+import io
+import itertools
+import json
 import logging
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-try:
-    import edge_tts
-    EDGE_TTS_AVAILABLE = True
-except Exception:
-    edge_tts = None
-    EDGE_TTS_AVAILABLE = False
-
 from voices import pick_voice
+from tts_cache import cache_from_env
+from timeline import Timeline
+from deck import iter_deck
+import mp3frames
+import jobs
+import profiles
+from tts_runtime import TTSRuntime
+from upstream import CircuitOpen, InputRejected, upstream_from_env
+from zipstream import ZipStream
+from sprites import SpriteStore, DEFAULT_SPRITES_DIR, DEFAULT_SPRITES_MAX_MB, degraded_items
+from metrics import metrics, stage, timed, silent_fallback, degraded_segments, server_timing
 
-# Configure pydub with ffmpeg from imageio-ffmpeg package
-# This is needed for deployment on platforms like Render where
-# system ffmpeg is not available
+# edge-tts (aiohttp) and pydub are imported on first use to keep cold
+# starts fast; None means "not tried yet"
+edge_tts = None
+EDGE_TTS_AVAILABLE = None
 AudioSegment = None
-PYDUB_AVAILABLE = False
-try:
-    from pydub import AudioSegment
-    PYDUB_AVAILABLE = True
-except Exception as e:
-    logging.warning(f'pydub not available: {e}')
-    AudioSegment = None
-    PYDUB_AVAILABLE = False
-
-if PYDUB_AVAILABLE:
-    try:
-        import imageio_ffmpeg
-        ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
-        AudioSegment.converter = ffmpeg_path
-        AudioSegment.ffmpeg = ffmpeg_path
-        AudioSegment.ffprobe = ffmpeg_path.replace('ffmpeg', 'ffprobe') if 'ffmpeg' in ffmpeg_path else None
-        logging.info(f'pydub configured successfully with ffmpeg: {ffmpeg_path}')
-    except Exception as e:
-        # Keep pydub available; it may still work if ffmpeg is on PATH
-        logging.warning(f'ffmpeg not configured via imageio-ffmpeg: {e}')
+PYDUB_AVAILABLE = None
+
+
+def load_edge_tts():
+    """Import the TTS provider on first use. Returns the module or None."""
+    global edge_tts, EDGE_TTS_AVAILABLE
+    if EDGE_TTS_AVAILABLE is None:
+        try:
+            if os.environ.get('TTS_PROVIDER') == 'fake':
+                # offline stand-in for benchmarks and local runs
+                import fake_tts as provider
+            else:
+                import edge_tts as provider
+            edge_tts = provider
+            EDGE_TTS_AVAILABLE = True
+        except Exception:
+            logging.exception('edge-tts not available')
+            EDGE_TTS_AVAILABLE = False
+    return edge_tts
+
+
+def load_pydub():
+    """Import pydub on first use. Returns AudioSegment or None."""
+    global AudioSegment, PYDUB_AVAILABLE
+    if PYDUB_AVAILABLE is None:
+        try:
+            from pydub import AudioSegment as segment_cls
+        except Exception as e:
+            logging.warning(f'pydub not available: {e}')
+            PYDUB_AVAILABLE = False
+            return None
+        # Configure pydub with ffmpeg from imageio-ffmpeg package
+        # This is needed for deployment on platforms like Render where
+        # system ffmpeg is not available
+        try:
+            import imageio_ffmpeg
+            ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
+            segment_cls.converter = ffmpeg_path
+            segment_cls.ffmpeg = ffmpeg_path
+            segment_cls.ffprobe = ffmpeg_path.replace('ffmpeg', 'ffprobe') if 'ffmpeg' in ffmpeg_path else None
+            logging.info(f'pydub configured successfully with ffmpeg: {ffmpeg_path}')
+        except Exception as e:
+            # Keep pydub available; it may still work if ffmpeg is on PATH
+            logging.warning(f'ffmpeg not configured via imageio-ffmpeg: {e}')
+        AudioSegment = segment_cls
+        PYDUB_AVAILABLE = True
+    return AudioSegment
 import zipfile
 
 app = Flask(__name__)
 DEFAULT_PAUSE_EN_TO_LA = 350
 DEFAULT_PAUSE_BETWEEN = 700
+# Max concurrent upstream TTS calls per export request
+TTS_CONCURRENCY = int(os.environ.get('TTS_CONCURRENCY', '8'))
+# Join same-format MP3 clips frame by frame instead of decoding them
+MP3_FRAME_JOIN = os.environ.get('MP3_FRAME_JOIN', '1') != '0'
+# Segments synthesized ahead of the one being streamed
+STREAM_WINDOW = int(os.environ.get('STREAM_WINDOW', str(TTS_CONCURRENCY)))
+# Rows synthesized between checkpoints of a background export job
+EXPORT_JOB_BATCH_ROWS = int(os.environ.get('EXPORT_JOB_BATCH_ROWS', '50'))
+# Exports larger than this are spilled to an anonymous temp file instead of memory
+EXPORT_SPILL_BYTES = int(float(os.environ.get('EXPORT_SPILL_MB', '32')) * 1024 * 1024)
+# Cache lifetime of GET /synthesize_text responses (browsers and CDNs)
+SPEECH_MAX_AGE = int(os.environ.get('SPEECH_MAX_AGE', str(30 * 24 * 3600)))
+
+# Shared (text, voice) -> MP3 cache; set TTS_CACHE_MAX_MB=0 to disable
+tts_cache = cache_from_env()
+# One long-lived event loop for all upstream TTS calls in this process,
+# capped at TTS_MAX_IN_FLIGHT concurrent calls across all requests; the
+# upstream controller lowers that cap while Edge TTS is throttling us
+TTS_MAX_IN_FLIGHT = int(os.environ.get('TTS_MAX_IN_FLIGHT', '64'))
+tts_runtime = TTSRuntime(TTS_MAX_IN_FLIGHT, upstream_from_env(TTS_MAX_IN_FLIGHT))
 
 
 # Simple CORS support without external dependency
@@ -50,68 +108,358 @@ DEFAULT_PAUSE_BETWEEN = 700
 def add_cors_headers(response):
     response.headers['Access-Control-Allow-Origin'] = '*'
     response.headers['Access-Control-Allow-Methods'] = 'GET,POST,OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type,Authorization,Range,If-None-Match'
+    response.headers['Access-Control-Expose-Headers'] = 'Content-Range,Accept-Ranges,Content-Length,ETag,Server-Timing,X-Degraded-Segments,Retry-After'
     return response
 
 
+# Endpoints whose responses carry Server-Timing and feed the request metrics
+SYNTHESIS_ENDPOINTS = {
+    'synthesize', 'synthesize_text', 'synthesize_combined',
+    'synthesize_combined_stream', 'compile_sprite', 'submit_job',
+}
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-def try_edge_save(text, voice, path):
-    if not EDGE_TTS_AVAILABLE:
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint
+    if endpoint not in SYNTHESIS_ENDPOINTS:
+        return response
+    # for streamed responses this is the time to the first byte
+    metrics.observe('imitatio_request_seconds', time.perf_counter() - g.request_started, endpoint=endpoint)
+    if response.status_code >= 500:
+        metrics.inc('imitatio_request_failures_total', endpoint=endpoint)
+    response.headers['Server-Timing'] = server_timing()
+    if response.content_length is not None:
+        if 200 <= response.status_code < 300:
+            # streamed responses send their headers before segments are known to fail
+            response.headers['X-Degraded-Segments'] = str(degraded_segments())
+        metrics.inc('imitatio_response_bytes_total', response.content_length, endpoint=endpoint)
+    else:
+        body = response.response
+
+        def counted():
+            for chunk in body:
+                metrics.inc('imitatio_response_bytes_total', len(chunk), endpoint=endpoint)
+                yield chunk
+
+        response.response = counted()
+    return response
+
+
+def upstream_unavailable():
+    """503 for when the upstream circuit breaker is open and nothing was synthesized."""
+    response = jsonify({'error': 'speech service unavailable, try again later'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, int(tts_runtime.upstream.retry_after())))
+    return response
+
+
+def upstream_blocked(voiced):
+    """True if the breaker is open and some `(text, voice)` in `voiced` is not cached.
+
+    Streamed responses are committed to 200 before anything is
+    synthesized, so they check this up front instead of sending a deck
+    of silence; a deck that is fully cached is still served.
+    """
+    if not tts_runtime.upstream.is_open():
         return False
-    try:
-        import asyncio
+    return any(text and text.strip() and not tts_cache.contains(tts_cache.key(text, voice))
+               for text, voice in voiced)
+
 
-        async def _save():
-            communicate = edge_tts.Communicate(text, voice)
-            await communicate.save(path)
+async def edge_synthesize_async(text, voice):
+    """Return MP3 bytes for `text` spoken by `voice`, or None on failure.
 
-        asyncio.run(_save())
-        return True
+    Blank or unspeakable text gives `b''`: callers lay it out as silence without counting
+    it as a fallback. Cache-aware; must run on `tts_runtime`'s loop. Cache files are read
+    and written on the loop's default executor so disk I/O never stalls
+    the other synthesis calls sharing the loop.
+    """
+    if not text or not text.strip():
+        # blank cells are common in decks; Edge has nothing to say for them
+        return b''
+    key = tts_cache.key(text, voice)
+    cached = await asyncio.get_running_loop().run_in_executor(None, tts_cache.get, key)
+    if cached:
+        return cached
+    # identical requests already in flight share one upstream call
+    return await tts_runtime.shared(key, lambda: _edge_synthesize(key, text, voice))
+
+
+async def _edge_synthesize(key, text, voice):
+    provider = load_edge_tts()
+    if provider is None:
+        return None
+    no_audio = getattr(getattr(provider, 'exceptions', provider), 'NoAudioReceived', ())
+    # Edge has no audio for text without a letter or digit; that is not
+    # throttling and retrying it cannot help
+    speakable = any(ch.isalnum() for ch in text)
+
+    async def _stream(connector):
+        kwargs = {'connector': connector} if connector is not None else {}
+        started = time.perf_counter()
+        communicate = provider.Communicate(text, voice, **kwargs)
+        chunks = []
+        try:
+            async for chunk in communicate.stream():
+                if chunk.get('type') == 'audio':
+                    chunks.append(chunk['data'])
+        except no_audio:
+            if not speakable:
+                raise InputRejected(f'no audio for unspeakable text {text[:50]!r}')
+            raise
+        metrics.observe('imitatio_tts_seconds', time.perf_counter() - started, voice=voice)
+        if not chunks:
+            if not speakable:
+                raise InputRejected(f'no audio for unspeakable text {text[:50]!r}')
+            # Edge answers a throttled request with an empty stream; retry it
+            raise ValueError('edge-tts returned no audio')
+        return b''.join(chunks)
+
+    try:
+        data = await tts_runtime.call(_stream)
+        await asyncio.get_running_loop().run_in_executor(None, tts_cache.put, key, data)
+        return data
+    except CircuitOpen:
+        # failing fast; the breaker already logged why
+        metrics.inc('imitatio_tts_failures_total', voice=voice)
+        return None
+    except InputRejected as e:
+        # nothing speakable: silent on purpose, like a blank cell
+        logging.info(str(e))
+        return b''
     except Exception:
         logging.exception('edge-tts failed')
-        try:
-            if os.path.exists(path):
-                os.remove(path)
-        except Exception:
-            pass
-        return False
+        metrics.inc('imitatio_tts_failures_total', voice=voice)
+        return None
+
+
+def resolve_voice(lang, gender=None):
+    use_gender = gender or os.environ.get('DEFAULT_VOICE_GENDER', 'female')
+    return pick_voice(lang or 'en', use_gender)
+
+
+def synthesize_one(text, lang, gender=None):
+    """Return MP3 bytes for a single text snippet, or None on failure."""
+    with stage('tts'):
+        return tts_runtime.run(edge_synthesize_async(text, resolve_voice(lang, gender)))
+
 
+def synthesize_batch(speech_jobs, concurrency=None):
+    """Synthesize many `(text, lang, gender)` `speech_jobs` on the shared loop.
 
+    At most `concurrency` (default `TTS_CONCURRENCY`) of this request's
+    upstream calls run at once, on top of the global TTS_MAX_IN_FLIGHT
+    cap. Returns the MP3 bytes of each job in input order, with `b''` for
+    blank text and None for jobs that failed so callers can substitute
+    their usual silence.
+    """
+    limit = max(1, concurrency or TTS_CONCURRENCY)
+
+    async def _run():
+        sem = asyncio.Semaphore(limit)
+
+        async def _one(text, lang, gender):
+            async with sem:
+                try:
+                    return await edge_synthesize_async(text, resolve_voice(lang, gender))
+                except Exception:
+                    logging.exception('batch synthesis failed')
+                    return None
+
+        return await asyncio.gather(*(_one(*job) for job in speech_jobs))
+
+    if not speech_jobs:
+        return []
+    with stage('tts'):
+        return list(tts_runtime.run(_run()))
+
+
+def synthesize_in_order(items, window=None):
+    """Yield `(tag, mp3_bytes)` for `(tag, text, voice)` items, in input order.
+
+    Up to `window` (default STREAM_WINDOW) items are synthesized ahead of
+    the one being yielded, so memory stays bounded however long `items`
+    is. `mp3_bytes` is `b''` for blank text and None for an item that failed. Closing the generator
+    cancels whatever is still in flight.
+    """
+    window = max(1, window or STREAM_WINDOW)
+    pending = collections.deque()
+    upcoming = iter(items)
+
+    def fill_window():
+        for tag, text, voice in upcoming:
+            pending.append((tag, tts_runtime.submit(edge_synthesize_async(text, voice))))
+            if len(pending) >= window:
+                break
 
-def synthesize_edge_save(text, lang, path, gender='female'):
-    """Synthesize text to MP3 using Edge TTS and the centralized voice map."""
     try:
-        voice_name = pick_voice(lang or 'en', gender or 'female')
-        return try_edge_save(text, voice_name, path)
-    except Exception:
-        logging.exception('synthesize_edge_save failed')
-        try:
-            if os.path.exists(path):
-                os.remove(path)
-        except Exception:
-            pass
-        return False
+        fill_window()
+        while pending:
+            tag, future = pending.popleft()
+            try:
+                with stage('tts'):
+                    data = future.result()
+            except Exception:
+                logging.exception('synthesis failed')
+                data = None
+            fill_window()
+            yield tag, data
+    finally:
+        # client went away or we finished: drop whatever is still in flight
+        for _, future in pending:
+            future.cancel()
+
 
+def open_timeline(clips):
+    """Choose how to assemble the synthesized MP3 `clips` (bytes or None).
 
-def gtts_save(text, lang, path, gender=None):
-    """Legacy wrapper kept for compatibility: routes call `gtts_save`.
-    Internally uses Edge TTS and centralized voice map. Accepts optional
-    `gender` ("female"|"male") and defaults to environment setting.
+    Returns `(timeline, load_clip)`. When every clip parses and shares one
+    MP3 format the timeline joins frames directly and no decoding happens;
+    with no audio at all (every clip blank or failed) it writes silence in
+    Edge's format. Otherwise (formats differ, or a clip is VBR or otherwise
+    unparseable) it is the PCM `Timeline` and `load_clip` decodes with pydub. Both
+    loaders take a clip's bytes and raise for a clip that failed to
+    synthesize so callers can substitute silence. Returns `(None, None)`
+    if neither path is usable.
     """
-    use_gender = gender or os.environ.get('DEFAULT_VOICE_GENDER', 'female')
-    synthesize_edge_save(text, lang, path, gender=use_gender)
+    if MP3_FRAME_JOIN:
+        parsed = {data: mp3frames.parse(data) for data in clips if data}
+        fmt = header = None
+        if not parsed:
+            # nothing but silence to write: Edge's format needs no decoder
+            fmt, header = mp3frames.EDGE_FORMAT, mp3frames.EDGE_HEADER
+        elif all(clip is not None for clip in parsed.values()):
+            fmt = mp3frames.common_format(parsed.values())
+            if fmt is not None:
+                header = next(c.header for c in parsed.values() if c is not None)
+        if fmt is not None:
 
-@app.route('/synthesize', methods=['POST'])
-def synthesize():
-    # Accepts form-data: file (csv) and optional numeric fields:
-    # pause_en_la_ms, pause_between_ms, repeat_latin, latin_repeat_pause_ms
-    f = request.files.get('file')
-    if not f:
-        return jsonify({"error":"no file uploaded"}), 400
+            def load_frames(data):
+                clip = parsed.get(data) if data else None
+                if clip is None:
+                    raise ValueError('no audio for clip')
+                return clip
+
+            return mp3frames.FrameTimeline(fmt, header), timed('decode', load_frames)
+    if load_pydub() is not None:
+        def load_pcm(data):
+            if not data:
+                raise ValueError('no audio for clip')
+            return AudioSegment.from_file(io.BytesIO(data), format='mp3')
+
+        return Timeline(), timed('decode', load_pcm)
+    return None, None
+
+
+def encode_audio(source, profile, input_format=None):
+    """Encode the audio file bytes `source` with `profile`, reusing cached results.
+
+    Encoded outputs live in the synthesis cache under a key of the source
+    bytes and the profile, so downloading the same deck or clip again in
+    the same profile skips ffmpeg.
+    """
+    key = profiles.cache_key(source, profile)
+    ext = profiles.extension(profile)
+    # not a synthesis lookup: keep it out of the TTS hit/miss counters
+    cached = tts_cache.get(key, ext, count=False)
+    if cached:
+        return cached
+    if load_pydub() is None:
+        raise RuntimeError('ffmpeg is not available for encoding')
+    with stage('encode'):
+        data = profiles.transcode(source, profile, AudioSegment.converter, input_format)
+    tts_cache.put(key, data, ext)
+    return data
+
+
+def export_audio(timeline, out, profile=None):
+    """Write the assembled `timeline` to the binary file object `out`.
+
+    Without a `profile` the output is MP3: frame-joined clips are written
+    to `out` frame by frame, so a spilling `out` bounds their memory; PCM
+    timelines are rendered whole and encoded with pydub's defaults.
+    """
+    if isinstance(timeline, mp3frames.FrameTimeline):
+        if profile is not None:
+            with stage('assembly'):
+                data = timeline.render_mp3()
+            out.write(encode_audio(data, profile))
+            return
+        with stage('assembly'):
+            timeline.write_mp3(out)
+    else:
+        with stage('assembly'):
+            audio = timeline.render()
+        if profile is not None:
+            # encode from PCM rather than from an intermediate MP3
+            wav = io.BytesIO()
+            audio.export(wav, format='wav')
+            out.write(encode_audio(wav.getvalue(), profile, 'wav'))
+            return
+        with stage('encode'):
+            audio.export(out, format='mp3')
+
+
+def export_buffer():
+    """In-memory buffer for an export that spills to disk past EXPORT_SPILL_BYTES."""
+    return tempfile.SpooledTemporaryFile(max_size=EXPORT_SPILL_BYTES)
+
+
+def send_export(buf, download_name, mimetype='audio/mpeg'):
+    """Send the audio written to `buf` (from `export_buffer`) as an attachment.
+
+    A spilled buffer is an unlinked temp file, so nothing is left behind
+    once the response closes it.
+    """
+    # pydub's export rewinds the file, so measure from the end
+    size = buf.seek(0, io.SEEK_END)
+    buf.seek(0)
+    if size <= EXPORT_SPILL_BYTES:
+        # still in memory; hand over the bytes so the server never asks
+        # for a file descriptor (which would roll the buffer onto disk)
+        with buf:
+            buf = io.BytesIO(buf.read())
+    response = send_file(buf, mimetype=mimetype, as_attachment=True, download_name=download_name)
+    response.content_length = size
+    return response
+
+
+def conform_clip(data, fmt):
+    """Parse MP3 `data` into frames of `fmt`, re-encoding with pydub if it differs."""
+    clip = mp3frames.parse(data)
+    if clip is not None and clip.format == fmt:
+        return clip
+    if load_pydub() is None:
+        raise ValueError('clip format differs from stream format and pydub is not available')
+    buf = io.BytesIO()
+    audio = AudioSegment.from_file(io.BytesIO(data))
+    audio.set_frame_rate(fmt.sample_rate).set_channels(fmt.channels).export(
+        buf, format='mp3', bitrate=f'{fmt.bitrate // 1000}k')
+    clip = mp3frames.parse(buf.getvalue())
+    if clip is None or clip.format != fmt:
+        raise ValueError('could not re-encode clip to stream format')
+    return clip
+
+
+conform_clip = timed('decode', conform_clip)
+
+
+def export_options(form):
+    """Read /synthesize pause, repeat, language and voice fields from `form`.
+
+    Returns a dict, or None if a numeric field is not an integer.
+    """
     # accept both legacy and new parameter names
     def int_field(*names, default=0):
         for n in names:
-            v = request.form.get(n)
+            v = form.get(n)
             if v is not None:
                 try:
                     return int(v)
@@ -119,162 +467,458 @@ def synthesize():
                     return None
         return default
 
-    pause_en_la = int_field('pause_en_la_ms', 'pause_ms_front_to_back', default=DEFAULT_PAUSE_EN_TO_LA)
-    pause_between = int_field('pause_between_ms', 'pause_between_rows', default=DEFAULT_PAUSE_BETWEEN)
-    repeat_latin = int_field('repeat_latin', 'repeat_times', default=1)
-    latin_repeat_pause = int_field('latin_repeat_pause_ms', 'repeat_pause_ms', default=400)
-
-    if None in (pause_en_la, pause_between, repeat_latin, latin_repeat_pause):
-        return jsonify({"error":"invalid numeric parameter"}), 400
-
-    df = pd.read_csv(f, dtype=str)
-    df.columns = [c.strip() for c in df.columns]
-    # detect front/back columns heuristically (support part1/part2 or English/Latin)
-    def find_col(possible):
-        for c in df.columns:
-            if c.strip().lower() in possible:
-                return c
+    opts = {
+        'pause_en_la': int_field('pause_en_la_ms', 'pause_ms_front_to_back', default=DEFAULT_PAUSE_EN_TO_LA),
+        'pause_between': int_field('pause_between_ms', 'pause_between_rows', default=DEFAULT_PAUSE_BETWEEN),
+        'repeat_latin': int_field('repeat_latin', 'repeat_times', default=1),
+        'latin_repeat_pause': int_field('latin_repeat_pause_ms', 'repeat_pause_ms', default=400),
+    }
+    if None in opts.values():
         return None
 
-    front_col = find_col(['part1','first','front','english','english_text'])
-    back_col = find_col(['part2','second','back','latin','1 pp','principal','principal parts','principal_parts'])
-    # fallback to first/second columns
-    if front_col is None and len(df.columns) >= 1:
-        front_col = df.columns[0]
-    if back_col is None and len(df.columns) >= 2:
-        back_col = df.columns[1]
-    if back_col is None and front_col is not None:
-        back_col = front_col
-
-    out_audio = AudioSegment.silent(duration=500)
-    temps = []
     # per-segment language hints
-    lang_front = request.form.get('language_for_front') or request.form.get('language') or 'en'
-    lang_back = request.form.get('language_for_back') or request.form.get('language') or 'la'
+    lang_front = form.get('language_for_front') or form.get('language') or 'en'
+    opts['lang_front'] = 'en' if (lang_front and str(lang_front).lower().startswith('en')) else lang_front
+    opts['lang_back'] = form.get('language_for_back') or form.get('language') or 'la'
+    opts['gender_front'] = form.get('voice_gender_front') or form.get('voice_gender') or os.environ.get('DEFAULT_VOICE_GENDER', 'female')
+    opts['gender_back'] = form.get('voice_gender_back') or form.get('voice_gender') or os.environ.get('DEFAULT_VOICE_GENDER', 'female')
+    return opts
 
-    if PYDUB_AVAILABLE:
-        for idx, row in df.iterrows():
-            front_text = str(row.get(front_col,'') or '')
-            back_text = str(row.get(back_col,'') or '')
 
-            tmp_front = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False).name
-            tmp_back = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False).name
-            temps.extend([tmp_front, tmp_back])
+def deck_jobs(texts, opts):
+    """Batch jobs for the front/back `texts` of each row, front first."""
+    speech_jobs = []
+    for front_text, back_text in texts:
+        speech_jobs.append((front_text, opts['lang_front'], opts['gender_front']))
+        speech_jobs.append((back_text, opts['lang_back'], opts['gender_back']))
+    return speech_jobs
 
-            # synthesize front using Edge TTS only (centralized voice map)
-            front_audio = None
-            gender_front = request.form.get('voice_gender_front') or request.form.get('voice_gender') or os.environ.get('DEFAULT_VOICE_GENDER', 'female')
-            try:
-                gtts_save(front_text, 'en' if (lang_front and str(lang_front).lower().startswith('en')) else lang_front, tmp_front, gender=gender_front)
-                front_audio = AudioSegment.from_file(tmp_front)
-            except Exception:
+
+def layout_deck(out_audio, load_clip, rows, opts):
+    """Lay out front, pause, repeated back and row pause for every `(front, back)` clip pair."""
+    repeat_latin = opts['repeat_latin']
+    out_audio.add_silence(500)
+    for front, back in rows:
+        try:
+            out_audio.add_audio(load_clip(front))
+        except Exception:
+            if front != b'':
+                # a blank cell is meant to be silent; anything else fell back
                 logging.exception('Front synthesis failed')
-                front_audio = AudioSegment.silent(duration=700)
+                silent_fallback()
+            out_audio.add_silence(700)
+        out_audio.add_silence(opts['pause_en_la'])
 
-            # synthesize back using Edge TTS only (centralized voice map)
-            back_audio = None
-            gender_back = request.form.get('voice_gender_back') or request.form.get('voice_gender') or os.environ.get('DEFAULT_VOICE_GENDER', 'female')
-            try:
-                gtts_save(back_text, lang_back, tmp_back, gender=gender_back)
-                back_audio = AudioSegment.from_file(tmp_back)
-            except Exception:
+        try:
+            back_audio = load_clip(back)
+        except Exception:
+            if back != b'':
                 logging.exception('Back synthesis failed')
-                back_audio = AudioSegment.silent(duration=700)
-
-            # append sequences with repeats
-            out_audio += front_audio + AudioSegment.silent(duration=pause_en_la)
-            for i in range(max(1, repeat_latin)):
-                out_audio += back_audio
-                if i < max(1, repeat_latin)-1:
-                    out_audio += AudioSegment.silent(duration=latin_repeat_pause)
-            out_audio += AudioSegment.silent(duration=pause_between)
+                silent_fallback()
+            back_audio = None
+
+        # append sequences with repeats
+        for i in range(max(1, repeat_latin)):
+            if back_audio is not None:
+                out_audio.add_audio(back_audio)
+            else:
+                out_audio.add_silence(700)
+            if i < max(1, repeat_latin)-1:
+                out_audio.add_silence(opts['latin_repeat_pause'])
+        out_audio.add_silence(opts['pause_between'])
+
+
+def write_rows_zip(clip_paths, zip_path):
+    """Write each row's front/back clip into a zip (used when clips cannot be joined)."""
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        for idx, (tmp_front, tmp_back) in enumerate(clip_paths, start=1):
+            for tmp in (tmp_front, tmp_back):
+                if not os.path.exists(tmp):
+                    open(tmp, 'wb').close()
+            zf.write(tmp_front, arcname=f'row{idx:03d}_front.mp3')
+            zf.write(tmp_back, arcname=f'row{idx:03d}_back.mp3')
+
+
+def deck_voiced(texts, opts):
+    """Yield `(text, voice)` for the front and back of every row, front first."""
+    voice_front = resolve_voice(opts['lang_front'], opts['gender_front'])
+    voice_back = resolve_voice(opts['lang_back'], opts['gender_back'])
+    for front_text, back_text in texts:
+        yield front_text, voice_front
+        yield back_text, voice_back
+
+
+def synthesized_rows(texts, opts):
+    """Yield `(front_mp3, back_mp3)` for each row as soon as it is synthesized."""
+    voiced = ((side, text, voice) for side, (text, voice)
+              in zip(itertools.cycle(('front', 'back')), deck_voiced(texts, opts)))
+
+    front = None
+    for side, data in synthesize_in_order(voiced):
+        if side == 'front':
+            front = data
+        else:
+            yield front, data
+
+
+def rows_zip_response(rows_audio, profile=None):
+    """Stream `flashaudios_rows.zip`, writing each row's entries as `rows_audio` yields them.
+
+    Entries are stored uncompressed and nothing touches the disk; a row
+    that failed to synthesize, or a blank cell, gets empty files, as before.
+    With a `profile` every clip is re-encoded to it. The headers are sent
+    before any row is synthesized, so when clips failed the archive ends
+    with a `degraded.json` entry (`degraded_segments` and the empty
+    `files`) in place of an `X-Degraded-Segments` header.
+    """
+    ext = profiles.extension(profile)
+
+    def generate():
+        archive = ZipStream()
+        degraded = []
+        for idx, (front, back) in enumerate(rows_audio, start=1):
+            names = (f'row{idx:03d}_front.{ext}', f'row{idx:03d}_back.{ext}')
+            # blank cells come through as b'' and are not fallbacks
+            missing = [name for name, data in zip(names, (front, back)) if data is None]
+            if missing:
+                silent_fallback(len(missing))
+                degraded.extend(missing)
+            if profile is not None:
+                front = front and encode_audio(front, profile)
+                back = back and encode_audio(back, profile)
+            archive.add(names[0], front or b'')
+            archive.add(names[1], back or b'')
+            yield archive.drain()
+        if degraded:
+            report = {'degraded_segments': len(degraded), 'files': degraded}
+            archive.add('degraded.json', json.dumps(report, indent=2).encode('utf-8'))
+        archive.close()
+        yield archive.drain()
+
+    return Response(stream_with_context(generate()), mimetype='application/zip', headers={
+        'Content-Disposition': 'attachment; filename=flashaudios_rows.zip',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@app.route('/synthesize', methods=['POST'])
+def synthesize():
+    # Accepts form-data: file (csv) and optional numeric fields:
+    # pause_en_la_ms, pause_between_ms, repeat_latin, latin_repeat_pause_ms
+    # output=zip returns per-row mp3 files instead of one combined mp3
+    # profile, codec, bitrate, sample_rate, mono select the output encoding
+    f = request.files.get('file')
+    if not f:
+        return jsonify({"error":"no file uploaded"}), 400
+
+    opts = export_options(request.form)
+    if opts is None:
+        return jsonify({"error":"invalid numeric parameter"}), 400
+    try:
+        profile = profiles.parse_profile(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if profile is not None and load_pydub() is None:
+        return jsonify({'error': 'pydub not available - cannot encode audio'}), 500
+
+    texts = list(iter_deck(f.stream))
+    if request.form.get('output') == 'zip' or (not MP3_FRAME_JOIN and load_pydub() is None):
+        # nothing to combine: stream each row into the zip as it is synthesized
+        if upstream_blocked(deck_voiced(texts, opts)):
+            return upstream_unavailable()
+        return rows_zip_response(synthesized_rows(texts, opts), profile)
+
+    # synthesize every front/back segment of the deck concurrently (Edge TTS only)
+    clips = synthesize_batch(deck_jobs(texts, opts))
+    if clips and all(clip is None for clip in clips) and tts_runtime.upstream.is_open():
+        return upstream_unavailable()
+    rows = list(zip(clips[0::2], clips[1::2]))
+
+    out_audio, load_clip = open_timeline(clips)
+    if out_audio is None:
+        # clips cannot be joined without pydub: return the individual mp3 files as a zip
+        return rows_zip_response(iter(rows))
+    layout_deck(out_audio, load_clip, rows, opts)
+
+    buf = export_buffer()
+    export_audio(out_audio, buf, profile)
+    return send_export(buf, f'combined.{profiles.extension(profile)}', profiles.mimetype(profile))
+
+
+def run_export_job(queue, job):
+    """Synthesize a queued deck in checkpointed batches, then assemble it.
+
+    Rows already checkpointed as done by an earlier attempt are skipped;
+    their clips are still in the job directory. If any row could not be
+    synthesized the job fails before assembly, keeping its checkpoints, so
+    a resume retries just those rows instead of shipping silence.
+    """
+    job_id = job['id']
+    opts = job['params']
+    # stored as JSON, so the profile comes back as a list
+    profile = profiles.Profile(*opts['profile']) if opts.get('profile') else None
+    work_dir = queue.job_dir(job_id)
+
+    def clip_paths(idx):
+        return (os.path.join(work_dir, f'row{idx:05d}_front.mp3'),
+                os.path.join(work_dir, f'row{idx:05d}_back.mp3'))
+
+    def read_clip(path):
+        try:
+            with open(path, 'rb') as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    pending = queue.rows(job_id, pending_only=True)
+    for start in range(0, len(pending), max(1, EXPORT_JOB_BATCH_ROWS)):
+        batch = pending[start:start + EXPORT_JOB_BATCH_ROWS]
+        texts = [(front, back) for _, front, back, _ in batch]
+        clips = synthesize_batch(deck_jobs(texts, opts))
+        states = {}
+        for n, (idx, _, _, _) in enumerate(batch):
+            # clips are the job's checkpoint: they must survive a restart
+            for path, data in zip(clip_paths(idx), clips[2 * n:2 * n + 2]):
+                if data is not None:
+                    # blank cells are kept as empty clips
+                    with open(path, 'wb') as fh:
+                        fh.write(data)
+                elif os.path.exists(path):
+                    os.remove(path)
+            failed = clips[2 * n] is None or clips[2 * n + 1] is None
+            states[idx] = jobs.ROW_DEGRADED if failed else jobs.ROW_DONE
+        queue.checkpoint(job_id, states)
+
+    degraded = queue.get(job_id)['degraded_rows']
+    if degraded:
+        raise RuntimeError(f'{degraded} rows could not be synthesized; resume the job to retry them')
+
+    paths = [clip_paths(r[0]) for r in queue.rows(job_id)]
+    clips = [read_clip(path) for pair in paths for path in pair]
+    out_audio, load_clip = open_timeline(clips)
+    if out_audio is not None:
+        result_name = f'combined.{profiles.extension(profile)}'
+        layout_deck(out_audio, load_clip, zip(clips[0::2], clips[1::2]), opts)
+        with open(queue.result_path(job_id, result_name), 'wb') as fh:
+            export_audio(out_audio, fh, profile)
     else:
-        # pydub not available: synthesize individual mp3 files and return a zip
-        zip_path = tempfile.NamedTemporaryFile(suffix='.zip', delete=False).name
-        with zipfile.ZipFile(zip_path, 'w') as zf:
-            idx = 1
-            for _, row in df.iterrows():
-                front_text = str(row.get(front_col,'') or '')
-                back_text = str(row.get(back_col,'') or '')
-                fn_front = f'row{idx:03d}_front.mp3'
-                fn_back = f'row{idx:03d}_back.mp3'
-                tmp_front = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False).name
-                tmp_back = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False).name
-                made_en = False
-                try:
-                    gender_front = request.form.get('voice_gender_front') or request.form.get('voice_gender') or os.environ.get('DEFAULT_VOICE_GENDER', 'female')
-                    gtts_save(front_text, 'en' if (lang_front and str(lang_front).lower().startswith('en')) else lang_front, tmp_front, gender=gender_front)
-                    made_en = True
-                except Exception:
-                    try:
-                        open(tmp_front,'wb').close()
-                    except Exception:
-                        pass
-                # For zip path (no pydub), follow same Latin flow when lang_back indicates Latin
-                try:
-                    gender_back = request.form.get('voice_gender_back') or request.form.get('voice_gender') or os.environ.get('DEFAULT_VOICE_GENDER', 'female')
-                    gtts_save(back_text, lang_back, tmp_back, gender=gender_back)
-                    made_la = True
-                except Exception:
-                    try:
-                        # fallback: try language short code
-                        gtts_save(back_text, (str(lang_back).split('-')[0] if lang_back else 'en'), tmp_back, gender=gender_back)
-                        made_la = True
-                    except Exception:
-                        try:
-                            gtts_save(back_text, 'en', tmp_back, gender=gender_back)
-                            made_la = True
-                        except Exception:
-                            open(tmp_back,'wb').close()
-                zf.write(tmp_front, arcname=fn_front)
-                zf.write(tmp_back, arcname=fn_back)
-                temps.extend([tmp_front, tmp_back])
-                idx += 1
-        # cleanup intermediate files will be handled below; send zip
-        response = send_file(zip_path, as_attachment=True, download_name='flashaudios_rows.zip')
-        for t in temps:
-            try: os.remove(t)
-            except: pass
-        return response
+        result_name = 'flashaudios_rows.zip'
+        write_rows_zip(paths, queue.result_path(job_id, result_name))
+    queue.finish(job_id, result_name)
+
+    # the result is complete; row checkpoints are no longer needed
+    for path in (path for pair in paths for path in pair):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+export_jobs = jobs.JobQueue(
+    os.environ.get('EXPORT_JOBS_DIR', jobs.DEFAULT_JOBS_DIR),
+    run_export_job,
+    workers=int(os.environ.get('EXPORT_WORKERS', '2')),
+    stale_after=float(os.environ.get('EXPORT_JOB_STALE_S', '300')),
+    retention=float(os.environ.get('EXPORT_JOB_RETENTION_H', str(7 * 24))) * 3600,
+)
+
+
+def job_info(job):
+    info = {k: job[k] for k in ('id', 'status', 'total_rows', 'done_rows', 'degraded_rows',
+                                'progress', 'attempts', 'error', 'created', 'updated')}
+    info['status_url'] = f"/jobs/{job['id']}"
+    if job['status'] == 'done':
+        info['download_url'] = f"/jobs/{job['id']}/download"
+    return info
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a CSV deck export in the background.
+    Accepts the same form-data as /synthesize.
+    Returns: 202 with the job id and status URL
+    """
+    f = request.files.get('file')
+    if not f:
+        return jsonify({"error":"no file uploaded"}), 400
+    opts = export_options(request.form)
+    if opts is None:
+        return jsonify({"error":"invalid numeric parameter"}), 400
+    try:
+        opts['profile'] = profiles.parse_profile(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job_id = export_jobs.submit(opts, list(iter_deck(f.stream)))
+    return jsonify(job_info(export_jobs.get(job_id))), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    export_jobs.start()
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job'}), 404
+    return jsonify(job_info(job))
+
+
+@app.route('/jobs/<job_id>/download', methods=['GET'])
+def job_download(job_id):
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"job is {job['status']}"}), 409
+    return send_file(export_jobs.result_path(job_id, job['result_name']),
+                     as_attachment=True, download_name=job['result_name'])
+
+
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+def job_resume(job_id):
+    """Requeue a failed job; rows completed before the failure are kept."""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job'}), 404
+    if not export_jobs.resume(job_id):
+        return jsonify({'error': f"job is {job['status']}"}), 409
+    return jsonify(job_info(export_jobs.get(job_id))), 202
+
+
+sprite_store = SpriteStore(
+    os.environ.get('SPRITES_DIR', DEFAULT_SPRITES_DIR),
+    int(float(os.environ.get('SPRITES_MAX_MB', str(DEFAULT_SPRITES_MAX_MB))) * 1024 * 1024),
+)
+
+
+def compile_deck_sprite(texts, opts, store=None):
+    """Render a deck into one audio sprite and return its index.
+
+    Nothing is synthesized when a sprite with the same texts and voices
+    already exists in `store` with every item intact. Raises `CircuitOpen`
+    instead of compiling a silent sprite while the upstream breaker is open
+    and the deck is not cached.
+    """
+    store = store or sprite_store
+    voice_front = resolve_voice(opts['lang_front'], opts['gender_front'])
+    voice_back = resolve_voice(opts['lang_back'], opts['gender_back'])
+    items = []
+    for row, (front_text, back_text) in enumerate(texts):
+        items.append((row, 'front', front_text, voice_front))
+        items.append((row, 'back', back_text, voice_back))
+    index = store.lookup(items)
+    if index is not None:
+        return index
+    if upstream_blocked((text, voice) for _, _, text, voice in items):
+        raise CircuitOpen('upstream TTS circuit is open')
+    clips = synthesize_in_order((item, item[2], item[3]) for item in items)
+    return store.compile(items, clips, conform_clip)
+
+
+@app.route('/sprites', methods=['POST'])
+def compile_sprite():
+    """Compile a CSV deck into an audio sprite.
+    Accepts the same form-data as /synthesize (pause/repeat fields are ignored).
+    Returns: JSON index with per-item byte and time offsets; fetch slices of
+    `url` with HTTP Range requests.
+    """
+    f = request.files.get('file')
+    if not f:
+        return jsonify({"error":"no file uploaded"}), 400
+    opts = export_options(request.form)
+    if opts is None:
+        return jsonify({"error":"invalid numeric parameter"}), 400
+    try:
+        index = dict(compile_deck_sprite(list(iter_deck(f.stream)), opts))
+    except CircuitOpen:
+        return upstream_unavailable()
+    index['url'] = f"/sprites/{index['sprite_id']}.mp3"
+    index['index_url'] = f"/sprites/{index['sprite_id']}.json"
+    return jsonify(index)
 
-    out_path = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False).name
-    out_audio.export(out_path, format='mp3')
 
-    # cleanup intermediate mp3s
-    for t in temps:
-        try: os.remove(t)
-        except: pass
+@app.route('/sprites/<sprite_id>.json', methods=['GET'])
+def sprite_index(sprite_id):
+    index = sprite_store.load_index(sprite_id)
+    if index is None:
+        return jsonify({'error': 'unknown sprite'}), 404
+    return jsonify(index)
 
-    return send_file(out_path, as_attachment=True, download_name='combined.mp3')
 
+@app.route('/sprites/<sprite_id>.mp3', methods=['GET'])
+def sprite_audio(sprite_id):
+    """Serve a sprite; supports Range requests and is cacheable forever (content-addressed).
 
-@app.route('/synthesize_text', methods=['POST'])
+    A sprite with silent fallbacks is recompiled by the next POST /sprites
+    under the same id, so it is revalidated on every use instead.
+    """
+    index = sprite_store.load_index(sprite_id)
+    if index is None:
+        return jsonify({'error': 'unknown sprite'}), 404
+    sprite_store.touch(sprite_id)
+    mp3_path, _ = sprite_store.paths(sprite_id)
+    if degraded_items(index):
+        return send_file(mp3_path, mimetype='audio/mpeg', conditional=True, etag=True, max_age=0)
+    return send_file(mp3_path, mimetype='audio/mpeg', conditional=True, etag=sprite_id,
+                     max_age=365 * 24 * 3600)
+
+
+@app.route('/synthesize_text', methods=['GET', 'POST'])
 def synthesize_text():
     """Simple endpoint to synthesize a single text snippet to MP3.
-    Accepts JSON: { text: string, lang: 'en'|'la'|... }
-    Returns: MP3 file
+    Accepts JSON: { text: string, lang: 'en'|'la'|..., gender: 'female'|'male' }
+    or the same fields as GET query parameters, plus the optional output
+    encoding fields (profile, codec, bitrate, sample_rate, mono). GET
+    responses are cacheable: they carry a strong ETag for the resolved
+    text, voice and encoding, a long Cache-Control lifetime (SPEECH_MAX_AGE)
+    and answer If-None-Match with 304.
+    Returns: audio file (MP3 unless another codec is requested)
     """
-    try:
-        data = request.get_json(force=True)
-    except Exception:
-        data = {}
+    if request.method == 'GET':
+        data = request.args
+    else:
+        try:
+            data = request.get_json(force=True)
+        except Exception:
+            data = {}
     text = data.get('text') if isinstance(data, dict) else None
     lang = (data.get('lang') if isinstance(data, dict) else None) or 'en'
     gender = (data.get('gender') if isinstance(data, dict) else None) or os.environ.get('DEFAULT_VOICE_GENDER', 'female')
-    if not text:
+    if not text or not text.strip():
         return jsonify({'error': 'no text provided'}), 400
-    out_path = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False).name
+    try:
+        profile = profiles.parse_profile(data if isinstance(data, dict) else {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    etag = None
+    if request.method == 'GET':
+        if profile is None:
+            etag = tts_cache.key(text, resolve_voice(lang, gender))
+        else:
+            etag = tts_cache.key(text, resolve_voice(lang, gender), profile=list(profile))
+        if etag in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.cache_control.public = True
+            response.cache_control.max_age = SPEECH_MAX_AGE
+            return response
     try:
         # use Edge-only pipeline
-        gtts_save(text, lang, out_path, gender=gender)
-        return send_file(out_path, as_attachment=True, download_name='speech.mp3')
+        audio = synthesize_one(text, lang, gender)
+        if audio and profile is not None:
+            audio = encode_audio(audio, profile)
     except Exception:
         logging.exception('synthesize_text failed')
-        try:
-            if os.path.exists(out_path): os.remove(out_path)
-        except Exception:
-            pass
+        audio = None
+    if not audio:
+        if tts_runtime.upstream.is_open():
+            return upstream_unavailable()
         return jsonify({'error':'synthesis failed'}), 500
+    download_name = f'speech.{profiles.extension(profile)}'
+    if etag is None:
+        return send_file(io.BytesIO(audio), mimetype=profiles.mimetype(profile), as_attachment=True,
+                         download_name=download_name)
+    return send_file(io.BytesIO(audio), mimetype=profiles.mimetype(profile), as_attachment=True,
+                     download_name=download_name, etag=etag, max_age=SPEECH_MAX_AGE)
 
 
 @app.route('/synthesize_combined', methods=['POST'])
@@ -283,13 +927,11 @@ def synthesize_combined():
     Accepts JSON: {
         segments: [{ text: string, lang: string }, ...],
         pause_ms: int (pause between segments within a row, default 500),
-        row_pause_ms: int (pause between rows, default 1000)
+        row_pause_ms: int (pause between rows, default 1000),
+        profile, codec, bitrate, sample_rate, mono (optional output encoding)
     }
-    Returns: Single combined MP3 file
+    Returns: Single combined audio file (MP3 unless another codec is requested)
     """
-    if not PYDUB_AVAILABLE:
-        return jsonify({'error': 'pydub not available - cannot combine audio'}), 500
-    
     try:
         data = request.get_json(force=True)
     except Exception:
@@ -304,68 +946,168 @@ def synthesize_combined():
     
     pause_ms = data.get('pause_ms', 500)
     row_pause_ms = data.get('row_pause_ms', 1000)
-    
-    # Start with a small silent intro
-    combined_audio = AudioSegment.silent(duration=200)
-    temps = []
+    try:
+        profile = profiles.parse_profile(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     try:
+        # synthesize all non-empty segments concurrently, then assemble in order
+        planned = []
+        speech_jobs = []
         for idx, segment in enumerate(segments):
             if not isinstance(segment, dict):
                 continue
             
             text = segment.get('text', '')
             lang = segment.get('lang', 'en')
-            is_row_boundary = segment.get('is_row_boundary', False)
             
             if not text:
                 continue
             
-            # Create temporary file for this segment
-            tmp_path = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False).name
-            temps.append(tmp_path)
-            
-            # Synthesize this segment
+            gender_seg = segment.get('gender') or os.environ.get('DEFAULT_VOICE_GENDER', 'female')
+            planned.append((idx, segment))
+            speech_jobs.append((text, lang, gender_seg))
+        clips = synthesize_batch(speech_jobs)
+        if clips and all(clip is None for clip in clips) and tts_runtime.upstream.is_open():
+            return upstream_unavailable()
+
+        combined_audio, load_clip = open_timeline(clips)
+        if combined_audio is None:
+            return jsonify({'error': 'pydub not available - cannot combine audio'}), 500
+        # Start with a small silent intro
+        combined_audio.add_silence(200)
+
+        for (idx, segment), clip in zip(planned, clips):
+            is_row_boundary = segment.get('is_row_boundary', False)
             try:
-                gender_seg = segment.get('gender') or os.environ.get('DEFAULT_VOICE_GENDER', 'female')
-                gtts_save(text, lang, tmp_path, gender=gender_seg)
-                segment_audio = AudioSegment.from_file(tmp_path)
-                combined_audio += segment_audio
+                segment_audio = load_clip(clip)
+                combined_audio.add_audio(segment_audio)
                 
                 # Add pause after segment
                 # Use row_pause_ms if this is a row boundary, otherwise use pause_ms
                 if is_row_boundary and idx < len(segments) - 1:
-                    combined_audio += AudioSegment.silent(duration=row_pause_ms)
+                    combined_audio.add_silence(row_pause_ms)
                 elif idx < len(segments) - 1:
-                    combined_audio += AudioSegment.silent(duration=pause_ms)
+                    combined_audio.add_silence(pause_ms)
                     
             except Exception:
-                logging.exception(f'Failed to synthesize segment {idx}: {text[:50]}')
+                if clip != b'':
+                    logging.exception(f'Failed to synthesize segment {idx}: {segment.get("text", "")[:50]}')
+                    silent_fallback()
                 # Add silent duration as fallback
-                combined_audio += AudioSegment.silent(duration=500)
+                combined_audio.add_silence(500)
         
         # Export combined audio
-        out_path = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False).name
-        combined_audio.export(out_path, format='mp3')
-        
-        # Clean up temporary files
-        for tmp in temps:
-            try:
-                os.remove(tmp)
-            except Exception:
-                pass
-        
-        return send_file(out_path, as_attachment=True, download_name='combined.mp3')
+        buf = export_buffer()
+        export_audio(combined_audio, buf, profile)
+        return send_export(buf, f'combined.{profiles.extension(profile)}', profiles.mimetype(profile))
         
     except Exception:
         logging.exception('synthesize_combined failed')
-        # Clean up temporary files
-        for tmp in temps:
+        return jsonify({'error': 'synthesis failed'}), 500
+
+@app.route('/synthesize_combined/stream', methods=['POST'])
+def synthesize_combined_stream():
+    """Streaming variant of /synthesize_combined (same JSON body).
+
+    MP3 bytes are sent as a chunked response in segment order as soon as
+    each prefix of the timeline is ready. At most STREAM_WINDOW segments are
+    synthesized ahead of the one being sent, so memory does not grow with
+    deck size. The stream uses Edge's native MP3 format; clips in any other
+    format are re-encoded to match.
+
+    The response starts before any segment is synthesized, so it carries
+    no `X-Degraded-Segments` header; segments replaced by silence are only
+    counted in `imitatio_silent_fallbacks_total` on /metrics. Clients that
+    need the per-request count should use /synthesize_combined.
+    """
+    try:
+        data = request.get_json(force=True)
+    except Exception:
+        data = {}
+
+    if not isinstance(data, dict):
+        return jsonify({'error': 'invalid request format'}), 400
+
+    segments = data.get('segments', [])
+    if not segments or not isinstance(segments, list):
+        return jsonify({'error': 'no segments provided'}), 400
+
+    pause_ms = data.get('pause_ms', 500)
+    row_pause_ms = data.get('row_pause_ms', 1000)
+    planned = [(idx, segment) for idx, segment in enumerate(segments)
+               if isinstance(segment, dict) and segment.get('text', '')]
+    window = max(1, STREAM_WINDOW)
+
+    def segment_voice(segment):
+        gender_seg = segment.get('gender') or os.environ.get('DEFAULT_VOICE_GENDER', 'female')
+        return resolve_voice(segment.get('lang', 'en'), gender_seg)
+
+    if upstream_blocked((segment['text'], segment_voice(segment)) for _, segment in planned):
+        return upstream_unavailable()
+
+    def generate():
+        timeline = mp3frames.FrameTimeline(mp3frames.EDGE_FORMAT, mp3frames.EDGE_HEADER)
+        # Start with a small silent intro
+        timeline.add_silence(200)
+        yield timeline.render_mp3()
+
+        voiced = (((idx, segment), segment['text'], segment_voice(segment)) for idx, segment in planned)
+        for (idx, segment), clip_data in synthesize_in_order(voiced, window):
             try:
-                os.remove(tmp)
+                if not clip_data:
+                    raise ValueError('synthesis failed')
+                timeline.add_audio(conform_clip(clip_data, timeline.format))
+                if segment.get('is_row_boundary', False) and idx < len(segments) - 1:
+                    timeline.add_silence(row_pause_ms)
+                elif idx < len(segments) - 1:
+                    timeline.add_silence(pause_ms)
             except Exception:
-                pass
-        return jsonify({'error': 'synthesis failed'}), 500
+                if clip_data != b'':
+                    logging.exception(f'Failed to synthesize segment {idx}: {segment.get("text", "")[:50]}')
+                    silent_fallback()
+                # Add silent duration as fallback
+                timeline.add_silence(500)
+            chunk = timeline.render_mp3()
+            if chunk:
+                yield chunk
+
+    return Response(stream_with_context(generate()), mimetype='audio/mpeg', headers={
+        'Content-Disposition': 'attachment; filename=combined.mp3',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@app.route('/upstream/stats', methods=['GET'])
+def upstream_stats():
+    """Adaptive concurrency limit, retry and circuit breaker state for Edge TTS."""
+    return jsonify(tts_runtime.upstream.stats())
+
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for this worker's view of the synthesis cache."""
+    return jsonify(tts_cache.stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Pipeline counters and timers in the Prometheus text format."""
+    cache = tts_cache.stats()
+    metrics.set('imitatio_tts_cache_hits_total', cache['hits'])
+    metrics.set('imitatio_tts_cache_misses_total', cache['misses'])
+    metrics.set('imitatio_tts_in_flight', tts_runtime.in_flight)
+    metrics.set('imitatio_tts_coalesced_total', tts_runtime.coalesced)
+    upstream = tts_runtime.upstream.stats()
+    metrics.set('imitatio_tts_concurrency_limit', upstream['limit'])
+    metrics.set('imitatio_tts_retries_total', upstream['retried'])
+    metrics.set('imitatio_tts_rejected_total', upstream['rejected'])
+    metrics.set('imitatio_tts_circuit_open', 0 if upstream['state'] == 'closed' else 1)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 
 if __name__ == '__main__':
+    # pick up jobs left queued or interrupted by a previous run
+    export_jobs.start()
     app.run(debug=True, host='0.0.0.0', port=5000)
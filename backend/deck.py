@@ -0,0 +1,59 @@
+"""Streaming reader for uploaded CSV decks.
+
+Rows are parsed with the standard `csv` module one at a time, so a deck
+is never loaded into a DataFrame. Front/back columns are picked by the
+same header heuristics the export has always used.
+"""
+import csv
+import io
+
+FRONT_COLUMNS = ['part1', 'first', 'front', 'english', 'english_text']
+BACK_COLUMNS = ['part2', 'second', 'back', 'latin', '1 pp', 'principal', 'principal parts', 'principal_parts']
+
+
+def pick_columns(header):
+    """Return `(front_idx, back_idx)` for a CSV header row (None if empty)."""
+    columns = [c.strip().lower() for c in header]
+
+    # detect front/back columns heuristically (support part1/part2 or English/Latin)
+    def find_col(possible):
+        for i, c in enumerate(columns):
+            if c in possible:
+                return i
+        return None
+
+    front_idx = find_col(FRONT_COLUMNS)
+    back_idx = find_col(BACK_COLUMNS)
+    # fallback to first/second columns
+    if front_idx is None and len(columns) >= 1:
+        front_idx = 0
+    if back_idx is None and len(columns) >= 2:
+        back_idx = 1
+    if back_idx is None and front_idx is not None:
+        back_idx = front_idx
+    return front_idx, back_idx
+
+
+def iter_deck(stream):
+    """Yield `(front_text, back_text)` for each row of a binary CSV stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if not header:
+            return
+        front_idx, back_idx = pick_columns(header)
+
+        def cell(record, idx):
+            if idx is None or idx >= len(record):
+                return ''
+            return record[idx]
+
+        for record in reader:
+            # blank lines are not rows
+            if not any(c.strip() for c in record):
+                continue
+            yield cell(record, front_idx), cell(record, back_idx)
+    finally:
+        # leave the upload stream open for its owner
+        text.detach()
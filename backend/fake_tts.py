@@ -0,0 +1,76 @@
+"""Offline stand-in for `edge_tts` used by benchmarks and local runs.
+
+Start the backend with `TTS_PROVIDER=fake` to use it. `Communicate`
+mirrors the parts of `edge_tts.Communicate` the backend uses (`stream()`
+and `save()`) and returns valid MP3 in Edge's own 24 kHz / 48 kbps mono
+format. The audio is silent, and its length grows with the text; like
+Edge, text without a letter or digit raises `NoAudioReceived`. Apart
+from FAKE_TTS_TRANSIENT_RATE, output is fully determined by the text and
+the settings below, so runs are reproducible:
+
+- FAKE_TTS_LATENCY_MS: delay before the first chunk (default 150)
+- FAKE_TTS_MS_PER_CHAR: spoken length per character (default 60)
+- FAKE_TTS_FAILURE_RATE: fraction of texts that always fail (default 0)
+- FAKE_TTS_TRANSIENT_RATE: fraction of calls that fail at random, the way
+  a throttled service does (default 0)
+"""
+import asyncio
+import hashlib
+import os
+import random
+
+import mp3frames
+
+BASE_MS = 300
+CHUNK_FRAMES = 40
+
+
+class NoAudioReceived(Exception):
+    pass
+
+
+def _setting(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return float(default)
+
+
+def _fails(text, voice, rate):
+    if rate <= 0:
+        return False
+    digest = hashlib.sha256(f'{voice}\0{text}'.encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') / 2 ** 32 < rate
+
+
+def fake_mp3(text):
+    """Silent Edge-format MP3 whose duration is proportional to `text`."""
+    fmt = mp3frames.EDGE_FORMAT
+    frame_ms = mp3frames.samples_per_frame(fmt) * 1000.0 / fmt.sample_rate
+    duration_ms = BASE_MS + _setting('FAKE_TTS_MS_PER_CHAR', 60) * len(text)
+    frames = max(1, int(duration_ms / frame_ms))
+    return mp3frames.silent_frame(mp3frames.EDGE_HEADER, fmt) * frames
+
+
+class Communicate:
+    def __init__(self, text, voice, **kwargs):
+        self.text = text
+        self.voice = voice
+
+    async def stream(self):
+        await asyncio.sleep(_setting('FAKE_TTS_LATENCY_MS', 150) / 1000.0)
+        if not any(ch.isalnum() for ch in self.text) or _fails(self.text, self.voice, _setting('FAKE_TTS_FAILURE_RATE', 0)):
+            raise NoAudioReceived('No audio was received.')
+        if random.random() < _setting('FAKE_TTS_TRANSIENT_RATE', 0):
+            raise NoAudioReceived('No audio was received.')
+        data = fake_mp3(self.text)
+        frame_len = len(mp3frames.silent_frame(mp3frames.EDGE_HEADER, mp3frames.EDGE_FORMAT))
+        step = frame_len * CHUNK_FRAMES
+        for pos in range(0, len(data), step):
+            yield {'type': 'audio', 'data': data[pos:pos + step]}
+
+    async def save(self, audio_fname, metadata_fname=None):
+        with open(audio_fname, 'wb') as fh:
+            async for chunk in self.stream():
+                if chunk['type'] == 'audio':
+                    fh.write(chunk['data'])
@@ -0,0 +1,23 @@
+"""Production server settings: `gunicorn -c gunicorn.conf.py app:app`.
+
+Threaded workers: a request thread hands its TTS coroutines to the
+process-wide event loop in tts_runtime.py and only waits on the result,
+so one process can keep hundreds of synthesis requests in flight while
+TTS_MAX_IN_FLIGHT bounds the load on the upstream service.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+threads = int(os.environ.get('WEB_THREADS', '256'))
+# long synchronous exports; prefer /jobs for large decks
+timeout = int(os.environ.get('WEB_TIMEOUT', '600'))
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_worker_init(worker):
+    # pick up export jobs left queued or interrupted by a previous run
+    from app import export_jobs
+    export_jobs.start()
@@ -0,0 +1,296 @@
+"""SQLite-backed export job queue with a background worker pool.
+
+A job is a deck (list of front/back rows) plus its export options. Rows
+are checkpointed as they are synthesized, so a job whose worker died, or
+that failed and was resumed, only re-synthesizes the rows that are not
+yet done. Several processes may share one queue directory: claiming a
+job is a single IMMEDIATE transaction, and a `running` job whose
+heartbeat is older than `stale_after` seconds is picked up again. The
+heartbeat is refreshed by a ticker thread for as long as the handler
+runs, so a long assembly or encode does not look like a dead worker.
+Finished and failed jobs, with their files, are deleted `retention`
+seconds after their last update.
+"""
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+DEFAULT_JOBS_DIR = os.path.join(tempfile.gettempdir(), 'imitatio-jobs')
+
+# row states
+ROW_PENDING = 0
+ROW_DONE = 1
+ROW_DEGRADED = 2  # synthesized with a silent fallback; retried on resume
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    total_rows INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    result_name TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_rows (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    front TEXT NOT NULL,
+    back TEXT NOT NULL,
+    state INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+
+class JobQueue:
+    def __init__(self, root, handler, workers=2, stale_after=300, poll_interval=2.0,
+                 retention=7 * 24 * 3600):
+        """`handler(queue, job)` runs a claimed job and must call `finish()`."""
+        self.root = root
+        self.db_path = os.path.join(root, 'jobs.sqlite3')
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+        self.retention = retention
+        # several beats per stale_after, so one slow write cannot cost the claim
+        self.heartbeat_interval = max(0.05, stale_after / 5.0)
+        self._next_purge = 0.0
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            os.makedirs(self.root, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            self._initialized = True
+        return conn
+
+    def job_dir(self, job_id):
+        path = os.path.join(self.root, job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def result_path(self, job_id, result_name):
+        return os.path.join(self.root, job_id, result_name)
+
+    # -- producer side -------------------------------------------------
+
+    def submit(self, params, rows):
+        """Queue a deck of `(front, back)` rows; returns the new job id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'INSERT INTO jobs (id, status, params, total_rows, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued', json.dumps(params), len(rows), now, now))
+            conn.executemany(
+                'INSERT INTO job_rows (job_id, idx, front, back) VALUES (?, ?, ?, ?)',
+                [(job_id, idx, front, back) for idx, (front, back) in enumerate(rows)])
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            job = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(conn.execute(
+                'SELECT state, COUNT(*) FROM job_rows WHERE job_id = ? GROUP BY state',
+                (job_id,)).fetchall())
+        finally:
+            conn.close()
+        info = dict(job)
+        info['params'] = json.loads(info['params'])
+        info['done_rows'] = counts.get(ROW_DONE, 0)
+        info['degraded_rows'] = counts.get(ROW_DEGRADED, 0)
+        processed = info['done_rows'] + info['degraded_rows']
+        info['progress'] = (processed / info['total_rows']) if info['total_rows'] else 1.0
+        return info
+
+    def resume(self, job_id):
+        """Requeue a failed job; completed rows are kept. Returns False if not failed."""
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'queued', error = NULL, updated = ? "
+                "WHERE id = ? AND status = 'failed'", (time.time(), job_id))
+            resumed = cur.rowcount == 1
+        finally:
+            conn.close()
+        if resumed:
+            self.start()
+            self._wake.set()
+        return resumed
+
+    # -- worker side ---------------------------------------------------
+
+    def rows(self, job_id, pending_only=False):
+        """Return `(idx, front, back, state)` tuples in deck order."""
+        sql = 'SELECT idx, front, back, state FROM job_rows WHERE job_id = ?'
+        if pending_only:
+            sql += f' AND state != {ROW_DONE}'
+        conn = self._connect()
+        try:
+            return [tuple(r) for r in conn.execute(sql + ' ORDER BY idx', (job_id,))]
+        finally:
+            conn.close()
+
+    def checkpoint(self, job_id, states):
+        """Record `{idx: state}` for synthesized rows and refresh the heartbeat."""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'UPDATE job_rows SET state = ? WHERE job_id = ? AND idx = ?',
+                [(state, job_id, idx) for idx, state in states.items()])
+            conn.execute('UPDATE jobs SET updated = ? WHERE id = ?', (time.time(), job_id))
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id):
+        """Refresh a running job's heartbeat so no other worker reclaims it."""
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE jobs SET updated = ? WHERE id = ? AND status = 'running'",
+                         (time.time(), job_id))
+        finally:
+            conn.close()
+
+    def _beat(self, job_id, stop):
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat(job_id)
+            except Exception:
+                logging.exception(f'export job {job_id} heartbeat failed')
+
+    def purge_expired(self):
+        """Delete done and failed jobs (rows, results, clips) older than `retention`."""
+        if not self.retention or self.retention <= 0:
+            return []
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            expired = [r[0] for r in conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND updated < ?",
+                (time.time() - self.retention,))]
+            for job_id in expired:
+                conn.execute('DELETE FROM job_rows WHERE job_id = ?', (job_id,))
+                conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        for job_id in expired:
+            shutil.rmtree(os.path.join(self.root, job_id), ignore_errors=True)
+        if expired:
+            logging.info(f'purged {len(expired)} expired export jobs')
+        return expired
+
+    def _maybe_purge(self):
+        with self._lock:
+            now = time.time()
+            if now < self._next_purge:
+                return
+            # a few sweeps per retention period, at most one every 10 minutes
+            self._next_purge = now + max(600.0, (self.retention or 0) / 10.0)
+        try:
+            self.purge_expired()
+        except Exception:
+            logging.exception('export job purge failed')
+
+    def finish(self, job_id, result_name):
+        self._set_status(job_id, 'done', result_name=result_name)
+
+    def fail(self, job_id, error):
+        self._set_status(job_id, 'failed', error=error)
+
+    def _set_status(self, job_id, status, error=None, result_name=None):
+        conn = self._connect()
+        try:
+            conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, result_name = ?, updated = ? WHERE id = ?',
+                (status, error, result_name, time.time(), job_id))
+        finally:
+            conn.close()
+
+    def _claim(self):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            job = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND updated < ?) ORDER BY created LIMIT 1",
+                (now - self.stale_after,)).fetchone()
+            if job is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ? "
+                    "WHERE id = ?", (now, job['id']))
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        if job is None:
+            return None
+        job = dict(job)
+        job['params'] = json.loads(job['params'])
+        return job
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+            except Exception:
+                logging.exception('export job claim failed')
+                job = None
+            if job is None:
+                self._maybe_purge()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            stop = threading.Event()
+            ticker = threading.Thread(target=self._beat, args=(job['id'], stop),
+                                      name=f"export-heartbeat-{job['id'][:8]}", daemon=True)
+            ticker.start()
+            try:
+                self.handler(self, job)
+            except Exception as e:
+                logging.exception(f"export job {job['id']} failed")
+                self.fail(job['id'], str(e) or e.__class__.__name__)
+            finally:
+                stop.set()
+                ticker.join()
+
+    def start(self):
+        """Start the worker threads once per process."""
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                t = threading.Thread(target=self._work, name=f'export-worker-{n}', daemon=True)
+                t.start()
+                self._threads.append(t)
@@ -0,0 +1,157 @@
+"""In-process counters and timers for the synthesis pipeline.
+
+`Metrics` keeps Prometheus-style counters, gauges and histograms and
+renders them in the text exposition format for `/metrics`, without
+needing prometheus_client. `stage()` times one stage of a request
+(tts, decode, assembly, encode). It feeds the stage histogram and, when
+called inside a Flask request, that request's Server-Timing totals.
+"""
+import contextlib
+import threading
+import time
+
+from flask import g, has_request_context
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_str(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}       # name -> (type, help)
+        self._values = {}     # (name, labels) -> float
+        self._histograms = {} # (name, labels) -> [bucket counts..., count, sum]
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(BUCKETS) + 2)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += 1
+            hist[-1] += seconds
+
+    def render(self):
+        """Prometheus text exposition format."""
+        with self._lock:
+            values = sorted(self._values.items())
+            histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+        lines = []
+        seen = set()
+
+        def header(name):
+            if name not in seen and name in self._meta:
+                kind, help_text = self._meta[name]
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+            seen.add(name)
+
+        for (name, labels), value in values:
+            header(name)
+            lines.append(f'{name}{_label_str(labels)} {value:g}')
+        for (name, labels), hist in histograms:
+            header(name)
+            for i, bound in enumerate(BUCKETS):
+                lines.append(f'{name}_bucket{_label_str(labels + (("le", f"{bound:g}"),))} {hist[i]}')
+            lines.append(f'{name}_bucket{_label_str(labels + (("le", "+Inf"),))} {hist[-2]}')
+            lines.append(f'{name}_count{_label_str(labels)} {hist[-2]}')
+            lines.append(f'{name}_sum{_label_str(labels)} {hist[-1]:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+metrics.describe('imitatio_tts_seconds', 'histogram', 'Upstream TTS call latency by voice.')
+metrics.describe('imitatio_tts_failures_total', 'counter', 'Upstream TTS calls that failed, by voice.')
+metrics.describe('imitatio_stage_seconds', 'histogram', 'Time spent per pipeline stage (tts, decode, assembly, encode).')
+metrics.describe('imitatio_request_seconds', 'histogram', 'Synthesis request handling time by endpoint.')
+metrics.describe('imitatio_request_failures_total', 'counter', 'Synthesis requests answered with a 5xx status, by endpoint.')
+metrics.describe('imitatio_response_bytes_total', 'counter', 'Response body bytes sent, by endpoint.')
+metrics.describe('imitatio_silent_fallbacks_total', 'counter', 'Segments replaced by silence because synthesis or decoding failed.')
+metrics.describe('imitatio_tts_cache_hits_total', 'counter', 'Synthesis cache hits in this process.')
+metrics.describe('imitatio_tts_cache_misses_total', 'counter', 'Synthesis cache misses in this process.')
+metrics.describe('imitatio_tts_in_flight', 'gauge', 'Upstream TTS calls currently in flight.')
+metrics.describe('imitatio_tts_coalesced_total', 'counter', 'Synthesis requests served by an identical upstream call already in flight.')
+metrics.describe('imitatio_tts_concurrency_limit', 'gauge', 'Current adaptive cap on concurrent upstream TTS calls.')
+metrics.describe('imitatio_tts_retries_total', 'counter', 'Upstream TTS attempts retried after a transient failure.')
+metrics.describe('imitatio_tts_rejected_total', 'counter', 'Upstream TTS calls refused while the circuit breaker was open.')
+metrics.describe('imitatio_tts_circuit_open', 'gauge', '1 while the upstream circuit breaker is open or half open.')
+
+
+def endpoint_label():
+    """Flask endpoint of the current request, or 'job' for background work."""
+    if has_request_context():
+        from flask import request
+        return request.endpoint or 'unknown'
+    return 'job'
+
+
+def add_request_timing(stage, seconds):
+    if has_request_context():
+        timings = g.setdefault('stage_seconds', {})
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe('imitatio_stage_seconds', elapsed, stage=name)
+        add_request_timing(name, elapsed)
+
+
+def timed(name, func):
+    """Wrap `func` so each call is timed as stage `name`."""
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def silent_fallback(count=1):
+    metrics.inc('imitatio_silent_fallbacks_total', count, endpoint=endpoint_label())
+    if has_request_context():
+        g.degraded_segments = g.get('degraded_segments', 0) + count
+
+
+def degraded_segments():
+    """Segments of the current request replaced by silence so far."""
+    return g.get('degraded_segments', 0)
+
+
+def server_timing():
+    """Server-Timing header value for the current request's stages."""
+    timings = g.get('stage_seconds', {})
+    parts = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items()]
+    started = g.get('request_started')
+    if started is not None:
+        parts.append(f'total;dur={(time.perf_counter() - started) * 1000:.1f}')
+    return ', '.join(parts)
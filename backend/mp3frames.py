@@ -0,0 +1,187 @@
+"""Decode-free MP3 joining at the frame level.
+
+Edge TTS returns CBR MPEG Layer III streams that all share one sample
+rate, channel layout and bitrate for a given output format. Such clips
+can be joined by concatenating their frames, and pauses can be filled
+with silent frames built from the same header, so the export never has
+to go through ffmpeg. `parse()` returns None for anything it does not
+understand and callers fall back to the decode path.
+"""
+from collections import namedtuple
+
+# Layer III bitrates (kbps) by bitrate index
+_BITRATES_V1 = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+_BITRATES_V2 = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+# sample rates by version bits (0 = MPEG 2.5, 2 = MPEG 2, 3 = MPEG 1)
+_SAMPLE_RATES = {
+    0: [11025, 12000, 8000],
+    2: [22050, 24000, 16000],
+    3: [44100, 48000, 32000],
+}
+
+Mp3Format = namedtuple('Mp3Format', 'version sample_rate channels bitrate')
+Mp3Clip = namedtuple('Mp3Clip', 'format frames header')
+
+# edge-tts always requests audio-24khz-48kbitrate-mono-mp3 (MPEG 2 Layer III)
+EDGE_HEADER = b'\xff\xf3\x64\xc4'
+EDGE_FORMAT = Mp3Format(version=2, sample_rate=24000, channels=1, bitrate=48000)
+
+
+def _parse_header(data, pos):
+    """Return `(format, frame_length, side_info_len)` for a frame at `pos`."""
+    if pos + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[pos], data[pos + 1], data[pos + 2], data[pos + 3]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_idx = (b2 >> 4) & 0x0F
+    rate_idx = (b2 >> 2) & 0x03
+    padding = (b2 >> 1) & 0x01
+    channel_mode = (b3 >> 6) & 0x03
+    if version == 1 or layer != 1 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+    channels = 1 if channel_mode == 3 else 2
+    sample_rate = _SAMPLE_RATES[version][rate_idx]
+    if version == 3:
+        bitrate = _BITRATES_V1[bitrate_idx] * 1000
+        frame_length = 144 * bitrate // sample_rate + padding
+        side_info = 17 if channels == 1 else 32
+    else:
+        bitrate = _BITRATES_V2[bitrate_idx] * 1000
+        frame_length = 72 * bitrate // sample_rate + padding
+        side_info = 9 if channels == 1 else 17
+    return Mp3Format(version, sample_rate, channels, bitrate), frame_length, side_info
+
+
+def _skip_id3v2(data):
+    if len(data) >= 10 and data[:3] == b'ID3':
+        size = ((data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 |
+                (data[8] & 0x7F) << 7 | (data[9] & 0x7F))
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def parse(data):
+    """Split an MP3 byte string into frames.
+
+    Returns an `Mp3Clip` or None when the data is empty, not Layer III,
+    or mixes formats (e.g. VBR), which the frame joiner cannot handle.
+    """
+    if not data:
+        return None
+    pos = _skip_id3v2(data)
+    fmt = None
+    header = None
+    frames = []
+    while pos < len(data):
+        parsed = _parse_header(data, pos)
+        if parsed is None:
+            # trailing ID3v1 tag or junk: stop once we already have audio
+            if frames:
+                break
+            return None
+        frame_fmt, length, side_info = parsed
+        if pos + length > len(data):
+            break
+        frame = data[pos:pos + length]
+        tag = frame[4 + side_info:8 + side_info]
+        if tag in (b'Xing', b'Info') or frame[36:40] == b'VBRI':
+            # encoder info frame carries no audio
+            pos += length
+            continue
+        if fmt is None:
+            fmt = frame_fmt
+            header = frame[:4]
+        elif frame_fmt != fmt:
+            return None
+        frames.append(frame)
+        pos += length
+    if not frames:
+        return None
+    return Mp3Clip(fmt, frames, header)
+
+
+def samples_per_frame(fmt):
+    return 1152 if fmt.version == 3 else 576
+
+
+def silent_frame(header, fmt):
+    """Build a frame with zeroed side info and main data, which decodes to silence."""
+    b = bytearray(header)
+    b[1] |= 0x01      # protection bit set: no CRC follows the header
+    b[2] &= ~0x02     # no padding byte
+    if fmt.version == 3:
+        length = 144 * fmt.bitrate // fmt.sample_rate
+    else:
+        length = 72 * fmt.bitrate // fmt.sample_rate
+    return bytes(b) + bytes(length - 4)
+
+
+def common_format(clips):
+    """Return the shared format of `clips` (Nones ignored) or None if they differ."""
+    formats = {clip.format for clip in clips if clip is not None}
+    if len(formats) != 1:
+        return None
+    return formats.pop()
+
+
+class FrameTimeline:
+    """Same interface as `timeline.Timeline`, but joins MP3 frames directly.
+
+    Silence is rounded to whole frames (24 ms at Edge's 24 kHz output).
+    """
+
+    def __init__(self, fmt, header):
+        self.format = fmt
+        self._silence = silent_frame(header, fmt)
+        self._frame_ms = samples_per_frame(fmt) * 1000.0 / fmt.sample_rate
+        self._chunks = []
+        self._frames = 0
+        self._bytes = 0
+        self._carry_ms = 0.0
+
+    @property
+    def duration_ms(self):
+        return int(self._frames * self._frame_ms)
+
+    @property
+    def byte_length(self):
+        """Total bytes added so far, including any already rendered."""
+        return self._bytes
+
+    def add_silence(self, duration_ms):
+        # carry the rounding remainder so long decks do not drift
+        total = self._carry_ms + max(0, int(duration_ms))
+        count = int(total // self._frame_ms)
+        self._carry_ms = total - count * self._frame_ms
+        if count:
+            self._chunks.append(self._silence * count)
+            self._frames += count
+            self._bytes += len(self._silence) * count
+
+    def add_audio(self, clip):
+        if clip.format != self.format:
+            raise ValueError('MP3 clip format differs from timeline format')
+        self._chunks.extend(clip.frames)
+        self._frames += len(clip.frames)
+        self._bytes += sum(len(frame) for frame in clip.frames)
+
+    def render_mp3(self):
+        """Return the MP3 bytes added since the previous call."""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+    def write_mp3(self, out):
+        """Write the MP3 bytes added since the previous call to the file object `out`.
+
+        Chunks are written one at a time and dropped as they go, so the
+        output is never joined into one bytes object.
+        """
+        chunks, self._chunks = self._chunks, []
+        for i, chunk in enumerate(chunks):
+            chunks[i] = None
+            out.write(chunk)
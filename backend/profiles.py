@@ -0,0 +1,126 @@
+"""Output encoding profiles for synthesized audio.
+
+By default exports stay in Edge's native MP3 (24 kHz / 48 kbps mono) and
+are never re-encoded. A request can instead ask for a codec (`mp3`,
+`opus` or `aac`), bitrate, sample rate and mono downmix, or name a
+preset such as `speech`. Encoding runs ffmpeg once per output, reading
+and writing through pipes.
+"""
+import collections
+import hashlib
+import subprocess
+
+Profile = collections.namedtuple('Profile', 'codec bitrate sample_rate mono')
+
+# codec -> (ffmpeg encoder, ffmpeg container, mimetype, file extension)
+CODECS = {
+    'mp3': ('libmp3lame', 'mp3', 'audio/mpeg', 'mp3'),
+    'opus': ('libopus', 'ogg', 'audio/ogg', 'opus'),
+    'aac': ('aac', 'adts', 'audio/aac', 'aac'),
+}
+
+SAMPLE_RATES = {8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000}
+# libopus only takes these input rates
+OPUS_SAMPLE_RATES = {8000, 12000, 16000, 24000, 48000}
+
+PRESETS = {
+    # speech-tuned: Edge voices carry nothing above 12 kHz and are mono
+    'speech': Profile('opus', 16, 24000, True),
+    # same idea for players without Opus support (older Safari)
+    'speech-mp3': Profile('mp3', 32, 24000, True),
+    'speech-aac': Profile('aac', 32, 24000, True),
+}
+
+# default bitrate (kbps) when only a codec is given
+DEFAULT_BITRATES = {'mp3': 48, 'opus': 24, 'aac': 48}
+
+
+def _truthy(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def parse_profile(fields):
+    """Build a `Profile` from request `fields` (form, query args or JSON).
+
+    Reads `profile` (a preset name), then `codec`, `bitrate` (kbps, "24"
+    or "24k"), `sample_rate` (Hz) and `mono`, which override the preset.
+    Returns None when none are given, meaning native MP3 passthrough.
+    Raises ValueError with a message for the client on bad values.
+    """
+    names = ('profile', 'codec', 'bitrate', 'sample_rate', 'mono')
+    if not any(fields.get(name) not in (None, '') for name in names):
+        return None
+
+    preset = fields.get('profile')
+    if preset:
+        if preset not in PRESETS:
+            raise ValueError(f"unknown profile '{preset}' (choose from {', '.join(sorted(PRESETS))})")
+        base = PRESETS[preset]
+    else:
+        base = None
+
+    codec = str(fields.get('codec') or (base.codec if base else 'mp3')).lower()
+    if codec not in CODECS:
+        raise ValueError(f"unsupported codec '{codec}' (choose from {', '.join(sorted(CODECS))})")
+
+    bitrate = fields.get('bitrate')
+    if bitrate in (None, ''):
+        bitrate = base.bitrate if base and base.codec == codec else DEFAULT_BITRATES[codec]
+    try:
+        bitrate = int(str(bitrate).lower().rstrip('k'))
+    except ValueError:
+        raise ValueError('bitrate must be a number of kbps')
+    if not 6 <= bitrate <= 320:
+        raise ValueError('bitrate must be between 6 and 320 kbps')
+
+    sample_rate = fields.get('sample_rate')
+    if sample_rate in (None, ''):
+        sample_rate = base.sample_rate if base else 24000
+    try:
+        sample_rate = int(sample_rate)
+    except (TypeError, ValueError):
+        raise ValueError('sample_rate must be an integer')
+    allowed = OPUS_SAMPLE_RATES if codec == 'opus' else SAMPLE_RATES
+    if sample_rate not in allowed:
+        raise ValueError(f"sample_rate must be one of {', '.join(str(r) for r in sorted(allowed))} for {codec}")
+
+    mono = fields.get('mono')
+    mono = (base.mono if base else True) if mono in (None, '') else _truthy(mono)
+    return Profile(codec, bitrate, sample_rate, mono)
+
+
+def mimetype(profile):
+    return CODECS[profile.codec][2] if profile else 'audio/mpeg'
+
+
+def extension(profile):
+    return CODECS[profile.codec][3] if profile else 'mp3'
+
+
+def cache_key(source, profile):
+    """Cache key for `source` audio bytes encoded with `profile`."""
+    digest = hashlib.sha256(source).hexdigest()
+    return hashlib.sha256(f'{digest}:{"/".join(map(str, profile))}'.encode('ascii')).hexdigest()
+
+
+def ffmpeg_args(profile):
+    """Output options selecting `profile`, as used by ffmpeg and pydub's `export`."""
+    encoder, container, _, _ = CODECS[profile.codec]
+    args = ['-c:a', encoder, '-b:a', f'{profile.bitrate}k', '-ar', str(profile.sample_rate)]
+    if profile.mono:
+        args += ['-ac', '1']
+    if profile.codec == 'opus':
+        args += ['-application', 'voip']
+    return args + ['-f', container]
+
+
+def transcode(data, profile, ffmpeg='ffmpeg', input_format=None):
+    """Encode the audio file in `data` (bytes) with `profile` and return the bytes."""
+    cmd = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin']
+    if input_format:
+        cmd += ['-f', input_format]
+    cmd += ['-i', 'pipe:0', '-vn'] + ffmpeg_args(profile) + ['pipe:1']
+    proc = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0 or not proc.stdout:
+        raise RuntimeError(f'ffmpeg failed: {proc.stderr.decode("utf-8", "replace").strip()}')
+    return proc.stdout
@@ -0,0 +1,216 @@
+"""Precompiled deck audio sprites.
+
+A sprite is one MP3 holding every front/back clip of a deck, separated
+by short gaps. Its JSON index gives each item's byte range and time
+range. Clips are joined at frame boundaries and each begins with a
+fresh bit reservoir, so a client can fetch any item with an HTTP Range
+request and play the slice on its own. Sprites are named by a hash of
+their content (texts, voices, gap), so recompiling an unchanged deck is
+free. Blank cells become empty items that take up only the gap. A
+sprite with items that failed to synthesize is kept so it can be
+served, but it is compiled again on the next request instead of being
+reused. Once the store grows past `max_bytes` the least recently used
+sprites are removed.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+import mp3frames
+from metrics import silent_fallback
+
+DEFAULT_SPRITES_DIR = os.path.join(tempfile.gettempdir(), 'imitatio-sprites')
+DEFAULT_SPRITES_MAX_MB = 1024
+# silence after every item so adjacent slices never bleed into each other
+SPRITE_GAP_MS = 300
+SPRITE_VERSION = 1
+
+_ID_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def sprite_id(items, gap_ms=SPRITE_GAP_MS):
+    """Content hash for `(row, side, text, voice)` items."""
+    payload = json.dumps([SPRITE_VERSION, gap_ms, [list(item) for item in items]], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def degraded_items(index):
+    """Number of front/back items in `index` that are silence instead of speech.
+
+    Empty items (blank cells) were never meant to be spoken and do not count.
+    """
+    return sum(1 for item in index['items'] for side in ('front', 'back')
+               if side in item and not item[side]['ok'])
+
+
+class SpriteStore:
+    def __init__(self, root, max_bytes=DEFAULT_SPRITES_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._evict_lock = threading.Lock()
+
+    def paths(self, sid):
+        if not _ID_RE.match(sid or ''):
+            raise ValueError('invalid sprite id')
+        return (os.path.join(self.root, f'{sid}.mp3'),
+                os.path.join(self.root, f'{sid}.json'))
+
+    def load_index(self, sid):
+        try:
+            _, index_path = self.paths(sid)
+            with open(index_path, encoding='utf-8') as fh:
+                return json.load(fh)
+        except (ValueError, OSError):
+            return None
+
+    def touch(self, sid):
+        """Mark a sprite as recently used so eviction keeps it."""
+        try:
+            for path in self.paths(sid):
+                os.utime(path, None)
+        except (ValueError, OSError):
+            pass
+
+    def lookup(self, items, gap_ms=SPRITE_GAP_MS):
+        """Return the stored index for `items` if it is complete and not degraded."""
+        sid = sprite_id(items, gap_ms)
+        index = self.load_index(sid)
+        if index is None or degraded_items(index):
+            return None
+        self.touch(sid)
+        return index
+
+    def compile(self, items, clips, conform, gap_ms=SPRITE_GAP_MS):
+        """Write the sprite and index for `items` and return the index.
+
+        `clips` yields `(item, mp3_bytes_or_None)` in item order and is
+        only consumed when no usable sprite is stored. `conform(data,
+        fmt)` turns a clip into frames of the sprite format. Audio is
+        written to disk as it arrives, so memory stays flat for big decks.
+        """
+        index = self.lookup(items, gap_ms)
+        if index is not None:
+            return index
+        sid = sprite_id(items, gap_ms)
+
+        os.makedirs(self.root, exist_ok=True)
+        mp3_path, index_path = self.paths(sid)
+        fmt = mp3frames.EDGE_FORMAT
+        timeline = mp3frames.FrameTimeline(fmt, mp3frames.EDGE_HEADER)
+        entries = {}
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for (row, side, text, voice), data in clips:
+                    start_ms, byte_start = timeline.duration_ms, timeline.byte_length
+                    # blank cells have nothing to say: they get just the gap
+                    empty = not text or not text.strip()
+                    ok = empty
+                    if data and not empty:
+                        try:
+                            timeline.add_audio(conform(data, fmt))
+                            ok = True
+                        except Exception:
+                            logging.exception(f'sprite clip {row}/{side} unusable')
+                    if not ok:
+                        # keep timing predictable: failed items are short silences
+                        silent_fallback()
+                        timeline.add_silence(700)
+                    entry = {
+                        'text': text,
+                        'voice': voice,
+                        'ok': ok,
+                        'start_ms': start_ms,
+                        'end_ms': timeline.duration_ms,
+                        'byte_start': byte_start,
+                        'byte_end': timeline.byte_length,
+                    }
+                    if empty:
+                        entry['empty'] = True
+                    entries.setdefault(row, {'row': row})[side] = entry
+                    timeline.add_silence(gap_ms)
+                    timeline.write_mp3(out)
+            index = {
+                'sprite_id': sid,
+                'format': {'codec': 'mp3', 'sample_rate': fmt.sample_rate,
+                           'channels': fmt.channels, 'bitrate': fmt.bitrate},
+                'gap_ms': gap_ms,
+                'duration_ms': timeline.duration_ms,
+                'byte_length': timeline.byte_length,
+                'items': [entries[row] for row in sorted(entries)],
+            }
+            os.replace(tmp_path, mp3_path)
+            tmp_path = None
+        finally:
+            if tmp_path:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+        # the index is written last: its presence marks a complete sprite
+        fd, tmp_index = tempfile.mkstemp(dir=self.root, suffix='.part')
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            json.dump(index, fh, ensure_ascii=False)
+        os.replace(tmp_index, index_path)
+        self.evict(keep=sid)
+        return index
+
+    def evict(self, keep=None):
+        """Drop least recently used sprites once the store grows past `max_bytes`.
+
+        Sprites are removed until usage is under 90% of the limit; `keep`
+        (the sprite just compiled) is never removed.
+        """
+        if self.max_bytes <= 0 or not self._evict_lock.acquire(blocking=False):
+            # disabled, or another thread is already evicting
+            return
+        try:
+            try:
+                names = os.listdir(self.root)
+            except OSError:
+                return
+            now = time.time()
+            sprites = {}
+            for name in names:
+                path = os.path.join(self.root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith('.part'):
+                    # left behind by a compile that died; live ones are fresh
+                    if now - st.st_mtime > 3600:
+                        _remove(path)
+                    continue
+                sid = name.rsplit('.', 1)[0]
+                used, size = sprites.get(sid, (0.0, 0))
+                sprites[sid] = (max(used, st.st_mtime), size + st.st_size)
+            total = sum(size for _, size in sprites.values())
+            if total <= self.max_bytes:
+                return
+            target = int(self.max_bytes * 0.9)
+            for used, sid in sorted((used, sid) for sid, (used, _) in sprites.items()):
+                if total <= target:
+                    break
+                if sid == keep or not _ID_RE.match(sid):
+                    continue
+                mp3_path, index_path = self.paths(sid)
+                # the index goes first so a half-removed sprite reads as missing
+                _remove(index_path)
+                _remove(mp3_path)
+                total -= sprites[sid][1]
+                logging.info(f'evicted sprite {sid}')
+        finally:
+            self._evict_lock.release()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,50 @@
+"""Shared setup: run the backend against the offline fake TTS provider.
+
+The app reads its settings at import time, so the environment is set up
+here before any test module imports it. Caching is off so every test
+sees real upstream calls, and all state lives in a throwaway directory.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+_STATE_DIR = tempfile.mkdtemp(prefix='imitatio-tests-')
+for name, value in {
+    'TTS_PROVIDER': 'fake',
+    'FAKE_TTS_LATENCY_MS': '0',
+    'FAKE_TTS_MS_PER_CHAR': '20',
+    'TTS_CACHE_MAX_MB': '0',
+    'TTS_BACKOFF_MS': '0',
+    'EXPORT_JOBS_DIR': os.path.join(_STATE_DIR, 'jobs'),
+    'SPRITES_DIR': os.path.join(_STATE_DIR, 'sprites'),
+}.items():
+    os.environ[name] = value
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """The Flask app module with a fresh upstream controller for each test."""
+    import app
+    from upstream import UpstreamController
+
+    monkeypatch.setattr(app.tts_runtime, 'upstream',
+                        UpstreamController(app.TTS_MAX_IN_FLIGHT, min_limit=2, backoff_s=0.0))
+    for name in ('FAKE_TTS_FAILURE_RATE', 'FAKE_TTS_TRANSIENT_RATE'):
+        monkeypatch.delenv(name, raising=False)
+    return app
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
+
+
+def deck_csv(rows):
+    """CSV bytes with an english/latin header for `(front, back)` rows."""
+    lines = ['english,latin'] + [f'{front},{back}' for front, back in rows]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
@@ -0,0 +1,40 @@
+import io
+
+import pytest
+
+from deck import iter_deck, pick_columns
+
+
+def read(text):
+    return list(iter_deck(io.BytesIO(text.encode('utf-8'))))
+
+
+@pytest.mark.parametrize('header, expected', [
+    (['English', 'Latin'], (0, 1)),
+    (['notes', 'part2', 'part1'], (2, 1)),
+    (['id', ' Front ', 'Principal Parts'], (1, 2)),
+    (['word', 'meaning'], (0, 1)),
+    (['only'], (0, 0)),
+    ([], (None, None)),
+])
+def test_pick_columns(header, expected):
+    assert pick_columns(header) == expected
+
+
+def test_iter_deck_reads_rows_in_order():
+    assert read('english,latin\nhello,salve\ngoodbye,vale\n') == [('hello', 'salve'), ('goodbye', 'vale')]
+
+
+def test_iter_deck_handles_bom_quotes_blank_lines_and_short_rows():
+    text = '\ufeffback,front\n"a, b",x\n\n ,  \nshort\n'
+    assert read(text) == [('x', 'a, b'), ('', 'short')]
+
+
+def test_iter_deck_empty_upload():
+    assert read('') == []
+
+
+def test_iter_deck_leaves_stream_open():
+    stream = io.BytesIO(b'english,latin\nhello,salve\n')
+    list(iter_deck(stream))
+    assert not stream.closed
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+import time
+
+import jobs
+import mp3frames
+from upstream import CLOSED, OPEN
+
+
+def wait_for(queue, job_id, statuses=('done', 'failed'), timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'job still {queue.get(job_id)["status"]}')
+
+
+def test_resume_after_failure_only_synthesizes_missing_rows(backend, monkeypatch, tmp_path):
+    monkeypatch.setattr(backend, 'EXPORT_JOB_BATCH_ROWS', 2)
+    synthesize_batch = backend.synthesize_batch
+    batches = []
+
+    def dies_on_third_batch(jobs_, concurrency=None):
+        batches.append(len(jobs_))
+        if len(batches) == 3:
+            raise RuntimeError('worker lost its connection')
+        return synthesize_batch(jobs_, concurrency)
+
+    monkeypatch.setattr(backend, 'synthesize_batch', dies_on_third_batch)
+    queue = jobs.JobQueue(str(tmp_path), backend.run_export_job, workers=1, poll_interval=0.02)
+    opts = backend.export_options({})
+    opts['profile'] = None
+    job_id = queue.submit(opts, [(f'word {i}', f'verbum {i}') for i in range(6)])
+
+    job = wait_for(queue, job_id)
+    assert job['status'] == 'failed'
+    assert job['done_rows'] == 4 and 'connection' in job['error']
+
+    upstream = backend.tts_runtime.upstream
+    calls_before = upstream.calls
+    monkeypatch.setattr(backend, 'synthesize_batch', synthesize_batch)
+    assert queue.resume(job_id)
+    job = wait_for(queue, job_id)
+
+    assert job['status'] == 'done' and job['attempts'] == 2
+    assert job['done_rows'] == 6
+    # only the two rows of the failed batch went upstream again
+    assert upstream.calls - calls_before == 4
+    with open(queue.result_path(job_id, job['result_name']), 'rb') as fh:
+        assert mp3frames.parse(fh.read()).format == mp3frames.EDGE_FORMAT
+
+
+def test_job_fails_while_upstream_is_down_and_resumes_later(backend, tmp_path):
+    upstream = backend.tts_runtime.upstream
+    upstream.state = OPEN
+    upstream._opened_at = time.monotonic()
+    queue = jobs.JobQueue(str(tmp_path), backend.run_export_job, workers=1, poll_interval=0.02)
+    opts = backend.export_options({})
+    opts['profile'] = None
+    job_id = queue.submit(opts, [('word 0', 'verbum 0'), ('word 1', '')])
+
+    job = wait_for(queue, job_id)
+    assert job['status'] == 'failed'
+    assert job['degraded_rows'] == 2 and 'resume' in job['error']
+
+    upstream.state = CLOSED
+    assert queue.resume(job_id)
+    job = wait_for(queue, job_id)
+    # the blank cell is a done row, not a degraded one
+    assert job['status'] == 'done'
+    assert job['done_rows'] == 2 and job['degraded_rows'] == 0
+
+
+def test_resume_only_applies_to_failed_jobs(backend, tmp_path):
+    queue = jobs.JobQueue(str(tmp_path), lambda q, job: q.finish(job['id'], 'x'), workers=1,
+                          poll_interval=0.02)
+    job_id = queue.submit({}, [('a', 'b')])
+    wait_for(queue, job_id)
+    assert not queue.resume(job_id)
+
+
+def test_heartbeat_keeps_a_long_job_from_being_reclaimed(tmp_path):
+    claims = []
+
+    def slow_handler(queue, job):
+        claims.append(job['id'])
+        # far longer than stale_after, with no checkpoint in between
+        time.sleep(0.6)
+        queue.finish(job['id'], 'result')
+
+    first = jobs.JobQueue(str(tmp_path), slow_handler, workers=1, stale_after=0.2, poll_interval=0.02)
+    second = jobs.JobQueue(str(tmp_path), slow_handler, workers=1, stale_after=0.2, poll_interval=0.02)
+    job_id = first.submit({}, [('a', 'b')])
+    second.start()
+    job = wait_for(first, job_id)
+    assert job['status'] == 'done'
+    assert claims == [job_id] and job['attempts'] == 1
+
+
+def test_stale_job_is_reclaimed(tmp_path):
+    done = threading.Event()
+
+    def handler(queue, job):
+        queue.finish(job['id'], 'result')
+        done.set()
+
+    queue = jobs.JobQueue(str(tmp_path), handler, workers=1, stale_after=0.2, poll_interval=0.02)
+    # a job left running by a worker that died an hour ago
+    queue._connect().close()
+    conn = sqlite3.connect(queue.db_path)
+    conn.execute("INSERT INTO jobs (id, status, params, total_rows, attempts, created, updated) "
+                 "VALUES ('dead', 'running', '{}', 0, 1, ?, ?)", (time.time() - 3600, time.time() - 3600))
+    conn.commit()
+    conn.close()
+    queue.start()
+    assert done.wait(5)
+    job = queue.get('dead')
+    assert job['status'] == 'done' and job['attempts'] == 2
+
+
+def test_purge_removes_expired_jobs_and_files(tmp_path):
+    queue = jobs.JobQueue(str(tmp_path), lambda q, job: q.finish(job['id'], 'x'), workers=1,
+                          poll_interval=0.02, retention=0.2)
+    old = queue.submit({}, [('a', 'b')])
+    wait_for(queue, old)
+    queue.job_dir(old)
+    time.sleep(0.3)
+    fresh = queue.submit({}, [('c', 'd')])
+    wait_for(queue, fresh)
+
+    assert queue.purge_expired() == [old]
+    assert queue.get(old) is None and not os.path.exists(os.path.join(str(tmp_path), old))
+    assert queue.rows(old) == []
+    assert queue.get(fresh)['status'] == 'done'
@@ -0,0 +1,134 @@
+import pytest
+
+import mp3frames
+from fake_tts import fake_mp3
+from timeline import Timeline
+
+# 64 kbps frame in Edge's otherwise identical MPEG 2 / 24 kHz / mono layout
+HEADER_64K = b'\xff\xf3\x84\xc4'
+FORMAT_64K = mp3frames.EDGE_FORMAT._replace(bitrate=64000)
+# same bitrate at 22.05 kHz
+HEADER_22K = b'\xff\xf3\x60\xc4'
+FORMAT_22K = mp3frames.EDGE_FORMAT._replace(sample_rate=22050)
+
+
+def frame(header, fmt):
+    return mp3frames.silent_frame(header, fmt)
+
+
+def test_parse_edge_clip():
+    clip = mp3frames.parse(fake_mp3('salve'))
+    assert clip.format == mp3frames.EDGE_FORMAT
+    assert clip.header == mp3frames.EDGE_HEADER
+    assert b''.join(clip.frames) == fake_mp3('salve')
+
+
+def test_parse_rejects_empty_junk_and_mixed_bitrates():
+    assert mp3frames.parse(b'') is None
+    assert mp3frames.parse(b'not an mp3 at all') is None
+    vbr = frame(mp3frames.EDGE_HEADER, mp3frames.EDGE_FORMAT) + frame(HEADER_64K, FORMAT_64K)
+    assert mp3frames.parse(vbr) is None
+
+
+def test_parse_skips_id3v2_and_stops_at_trailing_tag():
+    audio = fake_mp3('ave')
+    id3 = b'ID3\x04\x00\x00\x00\x00\x00\x05' + b'\x00' * 5
+    clip = mp3frames.parse(id3 + audio + b'TAG' + b'\x00' * 125)
+    assert b''.join(clip.frames) == audio
+
+
+def test_silent_frame_length_matches_bitrate():
+    # MPEG 2 Layer III: 72 * bitrate / sample_rate bytes per frame
+    assert len(frame(mp3frames.EDGE_HEADER, mp3frames.EDGE_FORMAT)) == 144
+    assert len(frame(HEADER_64K, FORMAT_64K)) == 192
+
+
+def test_common_format():
+    edge = mp3frames.parse(fake_mp3('a'))
+    other = mp3frames.parse(frame(HEADER_22K, FORMAT_22K) * 3)
+    assert mp3frames.common_format([edge, None, edge]) == mp3frames.EDGE_FORMAT
+    assert mp3frames.common_format([edge, other]) is None
+    assert mp3frames.common_format([]) is None
+
+
+def test_frame_timeline_silence_does_not_drift():
+    timeline = mp3frames.FrameTimeline(mp3frames.EDGE_FORMAT, mp3frames.EDGE_HEADER)
+    for _ in range(100):
+        timeline.add_silence(350)
+    # 24 ms frames: 35 s of 350 ms pauses rounds to within one frame
+    assert abs(timeline.duration_ms - 35000) <= 24
+    assert len(timeline.render_mp3()) == timeline.byte_length
+
+
+def test_open_timeline_joins_same_format_clips(backend):
+    clips = [fake_mp3('salve'), None, fake_mp3('vale')]
+    timeline, load = backend.open_timeline(clips)
+    assert isinstance(timeline, mp3frames.FrameTimeline)
+    timeline.add_audio(load(clips[0]))
+    timeline.add_silence(500)
+    timeline.add_audio(load(clips[2]))
+    joined = mp3frames.parse(timeline.render_mp3())
+    assert joined.format == mp3frames.EDGE_FORMAT
+
+
+def test_open_timeline_failed_clip_raises_for_silence(backend):
+    timeline, load = backend.open_timeline([fake_mp3('salve'), None])
+    with pytest.raises(ValueError):
+        load(None)
+
+
+def test_open_timeline_decodes_when_a_clip_cannot_be_parsed(backend):
+    vbr = frame(mp3frames.EDGE_HEADER, mp3frames.EDGE_FORMAT) + frame(HEADER_64K, FORMAT_64K)
+    timeline, _ = backend.open_timeline([fake_mp3('salve'), vbr])
+    assert isinstance(timeline, Timeline)
+
+
+def test_open_timeline_decodes_when_formats_differ(backend):
+    timeline, _ = backend.open_timeline([fake_mp3('salve'), frame(HEADER_22K, FORMAT_22K) * 3])
+    assert isinstance(timeline, Timeline)
+
+
+def test_open_timeline_without_pydub(backend, monkeypatch):
+    monkeypatch.setattr(backend, 'load_pydub', lambda: None)
+    vbr = frame(mp3frames.EDGE_HEADER, mp3frames.EDGE_FORMAT) + frame(HEADER_64K, FORMAT_64K)
+    assert backend.open_timeline([fake_mp3('salve'), vbr]) == (None, None)
+    timeline, _ = backend.open_timeline([fake_mp3('salve')])
+    assert isinstance(timeline, mp3frames.FrameTimeline)
+
+
+def test_open_timeline_writes_silence_without_pydub_when_no_clip_parses(backend, monkeypatch):
+    monkeypatch.setattr(backend, 'load_pydub', lambda: None)
+    timeline, load = backend.open_timeline([None, b''])
+    assert isinstance(timeline, mp3frames.FrameTimeline)
+    assert timeline.format == mp3frames.EDGE_FORMAT
+    with pytest.raises(ValueError):
+        load(None)
+    timeline.add_silence(500)
+    assert mp3frames.parse(timeline.render_mp3()).format == mp3frames.EDGE_FORMAT
+
+
+def test_write_mp3_matches_render_and_drains(backend):
+    def build():
+        timeline = mp3frames.FrameTimeline(mp3frames.EDGE_FORMAT, mp3frames.EDGE_HEADER)
+        timeline.add_silence(200)
+        timeline.add_audio(mp3frames.parse(fake_mp3('salve')))
+        timeline.add_silence(500)
+        return timeline
+
+    class Recorder:
+        def __init__(self):
+            self.writes = []
+
+        def write(self, data):
+            self.writes.append(data)
+
+    out = Recorder()
+    timeline = build()
+    timeline.write_mp3(out)
+    assert b''.join(out.writes) == build().render_mp3()
+    # written chunk by chunk, never as one joined copy
+    assert len(out.writes) > 2
+    assert max(len(w) for w in out.writes) < timeline.byte_length
+    written = len(out.writes)
+    timeline.write_mp3(out)
+    assert len(out.writes) == written
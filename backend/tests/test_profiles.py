@@ -0,0 +1,40 @@
+import pytest
+
+from profiles import PRESETS, Profile, parse_profile
+
+
+@pytest.mark.parametrize('fields, expected', [
+    ({}, None),
+    ({'profile': '', 'codec': ''}, None),
+    ({'profile': 'speech'}, PRESETS['speech']),
+    ({'codec': 'opus'}, Profile('opus', 24, 24000, True)),
+    ({'codec': 'MP3'}, Profile('mp3', 48, 24000, True)),
+    ({'bitrate': '24k'}, Profile('mp3', 24, 24000, True)),
+    ({'bitrate': 64}, Profile('mp3', 64, 24000, True)),
+    # overrides win over the preset
+    ({'profile': 'speech', 'bitrate': '32', 'mono': 'false'}, Profile('opus', 32, 24000, False)),
+    ({'profile': 'speech-mp3', 'sample_rate': '22050'}, Profile('mp3', 32, 22050, True)),
+    # another codec does not inherit the preset's bitrate
+    ({'profile': 'speech', 'codec': 'aac'}, Profile('aac', 48, 24000, True)),
+    ({'mono': 'yes'}, Profile('mp3', 48, 24000, True)),
+    ({'mono': '0'}, Profile('mp3', 48, 24000, False)),
+    ({'mono': False}, Profile('mp3', 48, 24000, False)),
+])
+def test_parse_profile(fields, expected):
+    assert parse_profile(fields) == expected
+
+
+@pytest.mark.parametrize('fields, message', [
+    ({'profile': 'tiny'}, 'unknown profile'),
+    ({'codec': 'flac'}, 'unsupported codec'),
+    ({'bitrate': 'fast'}, 'bitrate must be a number'),
+    ({'bitrate': '500k'}, 'between 6 and 320'),
+    ({'sample_rate': 'high'}, 'sample_rate must be an integer'),
+    ({'sample_rate': '12345'}, 'sample_rate must be one of'),
+    # libopus cannot take 22.05 or 44.1 kHz
+    ({'codec': 'opus', 'sample_rate': '22050'}, 'for opus'),
+    ({'profile': 'speech', 'sample_rate': '44100'}, 'for opus'),
+])
+def test_parse_profile_rejects(fields, message):
+    with pytest.raises(ValueError, match=message):
+        parse_profile(fields)
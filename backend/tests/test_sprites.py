@@ -0,0 +1,49 @@
+import io
+import os
+import sys
+import time
+
+import pytest
+
+from conftest import BACKEND, deck_csv
+from upstream import OPEN
+
+sys.path.insert(0, os.path.join(os.path.dirname(BACKEND), 'tools'))
+
+
+def post_deck(client, deck):
+    return client.post('/sprites', data={'file': (io.BytesIO(deck), 'deck.csv')},
+                       content_type='multipart/form-data')
+
+
+def test_blank_cells_are_empty_items_and_the_sprite_is_reused(backend, client):
+    deck = deck_csv([(f'word {i}', '') for i in range(5)])
+    r = post_deck(client, deck)
+    assert r.status_code == 200
+    index = r.get_json()
+    backs = [item['back'] for item in index['items']]
+    assert all(back['ok'] and back['empty'] for back in backs)
+    # an empty item is only the gap: it starts and ends at the same point
+    assert all(back['start_ms'] == back['end_ms'] for back in backs)
+    assert backend.degraded_items(index) == 0
+
+    audio = client.get(index['url'])
+    assert audio.cache_control.max_age == 365 * 24 * 3600
+
+    calls = backend.tts_runtime.upstream.stats()['calls']
+    assert post_deck(client, deck).get_json()['sprite_id'] == index['sprite_id']
+    assert backend.tts_runtime.upstream.stats()['calls'] == calls
+
+
+def test_compile_deck_cli_exits_cleanly_while_upstream_is_down(backend, tmp_path, capsys):
+    import compile_deck
+
+    deck = tmp_path / 'deck.csv'
+    deck.write_bytes(deck_csv([('hello', 'salve')]))
+    upstream = backend.tts_runtime.upstream
+    upstream.state = OPEN
+    upstream._opened_at = time.monotonic()
+    with pytest.raises(SystemExit) as exc:
+        compile_deck.main([str(deck), '--out-dir', str(tmp_path / 'sprites')])
+    assert exc.value.code.startswith('speech service unavailable')
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,75 @@
+import math
+import struct
+
+import pytest
+
+pydub = pytest.importorskip('pydub')
+from pydub import AudioSegment
+
+from timeline import Timeline
+
+
+def tone(ms, hz, frame_rate=24000):
+    """Mono 16-bit sine, so misplaced audio cannot pass for silence."""
+    frames = int(frame_rate * ms / 1000)
+    pcm = b''.join(struct.pack('<h', int(8000 * math.sin(2 * math.pi * hz * n / frame_rate)))
+                   for n in range(frames))
+    return AudioSegment(data=pcm, sample_width=2, frame_rate=frame_rate, channels=1)
+
+
+def load(clip):
+    if clip is None:
+        raise ValueError('no audio for clip')
+    return clip
+
+
+def concatenated_deck(rows, opts):
+    """The deck layout as it was built with `AudioSegment +=`, before Timeline."""
+    out = AudioSegment.silent(duration=500)
+    for front, back in rows:
+        front_audio = front if front is not None else AudioSegment.silent(duration=700)
+        back_audio = back if back is not None else AudioSegment.silent(duration=700)
+        out += front_audio + AudioSegment.silent(duration=opts['pause_en_la'])
+        for i in range(max(1, opts['repeat_latin'])):
+            out += back_audio
+            if i < max(1, opts['repeat_latin']) - 1:
+                out += AudioSegment.silent(duration=opts['latin_repeat_pause'])
+        out += AudioSegment.silent(duration=opts['pause_between'])
+    return out
+
+
+@pytest.mark.parametrize('repeat_latin', [0, 1, 3])
+def test_deck_layout_matches_concatenation(backend, repeat_latin):
+    # clips in the format of AudioSegment.silent(), so += never resamples
+    rate = 11025
+    rows = [(tone(400, 440, rate), tone(300, 660, rate)),
+            (None, tone(250, 330, rate)),
+            (tone(350, 550, rate), None)]
+    opts = {'pause_en_la': 600, 'pause_between': 900, 'repeat_latin': repeat_latin,
+            'latin_repeat_pause': 400}
+    timeline = Timeline()
+    backend.layout_deck(timeline, load, rows, opts)
+    rendered = timeline.render()
+    expected = concatenated_deck(rows, opts)
+    assert (rendered.frame_rate, rendered.channels, rendered.sample_width) == (rate, 1, 2)
+    assert bytes(rendered.raw_data) == expected.raw_data
+
+
+def test_render_converts_to_the_widest_format():
+    timeline = Timeline()
+    timeline.add_audio(tone(100, 440, frame_rate=16000))
+    timeline.add_silence(50)
+    timeline.add_audio(tone(100, 440, frame_rate=24000))
+    rendered = timeline.render()
+    assert rendered.frame_rate == 24000
+    assert len(rendered) == 250
+    # the timeline is consumed by rendering
+    assert timeline.duration_ms == 0
+
+
+def test_render_of_silence_only_uses_pydub_defaults():
+    timeline = Timeline()
+    timeline.add_silence(1000)
+    data, frame_rate, channels, sample_width = timeline.render_raw()
+    assert (frame_rate, channels, sample_width) == (11025, 1, 2)
+    assert data == bytes(11025 * 2)
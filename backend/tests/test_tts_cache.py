@@ -0,0 +1,136 @@
+import io
+import os
+import time
+
+from conftest import deck_csv
+from tts_cache import SynthesisCache
+
+
+def wait_until_idle(cache, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with cache._lock:
+            if not cache._evicting:
+                return
+        time.sleep(0.01)
+    raise AssertionError('eviction still running')
+
+
+def age(cache, key, seconds_ago):
+    stamp = time.time() - seconds_ago
+    os.utime(cache.path_for(key), (stamp, stamp))
+
+
+def test_round_trip_counts_hits_and_misses(tmp_path):
+    cache = SynthesisCache(str(tmp_path), 1024 * 1024)
+    key = cache.key('salve', 'la-voice')
+    assert cache.get(key) is None
+    cache.put(key, b'audio')
+    assert cache.get(key) == b'audio'
+    assert cache.contains(key)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['stores']) == (1, 1, 1)
+    assert stats['hit_rate'] == 0.5
+    # contains() is not a lookup
+    cache.contains(cache.key('vale', 'la-voice'))
+    assert cache.stats()['misses'] == 1
+
+
+def test_keys_depend_on_text_voice_and_params():
+    keys = {SynthesisCache.key('salve', 'a'), SynthesisCache.key('salve', 'b'),
+            SynthesisCache.key('vale', 'a'), SynthesisCache.key('salve', 'a', rate='+10%')}
+    assert len(keys) == 4
+
+
+def test_writes_are_atomic_and_leave_no_temp_files(tmp_path):
+    cache = SynthesisCache(str(tmp_path), 1024 * 1024)
+    key = cache.key('salve', 'la-voice')
+    cache.put(key, b'first')
+    cache.put(key, b'second')
+    assert cache.get(key) == b'second'
+    names = [name for _, _, files in os.walk(str(tmp_path)) for name in files]
+    assert names == [os.path.basename(cache.path_for(key))]
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = SynthesisCache(str(tmp_path), 0)
+    key = cache.key('salve', 'la-voice')
+    cache.put(key, b'audio')
+    assert cache.get(key) is None and not cache.contains(key)
+    assert cache.stats()['misses'] == 0
+
+
+def test_evict_drops_least_recently_used_down_to_90_percent(tmp_path):
+    cache = SynthesisCache(str(tmp_path), 1024 * 1024)
+    keys = [cache.key(f'word {i}', 'voice') for i in range(5)]
+    for i, key in enumerate(keys):
+        cache.put(key, b'x' * 250)
+        wait_until_idle(cache)
+        age(cache, key, 100 - i)
+    cache.max_bytes = 1000
+    # reading the oldest entry makes it the most recently used
+    cache.get(keys[0])
+    cache.evict()
+    assert cache.stats()['approx_bytes'] <= 900
+    assert [cache.contains(key) for key in keys] == [True, False, False, True, True]
+    assert cache.stats()['evictions'] == 2
+
+
+def test_evict_only_if_over_keeps_a_cache_under_the_limit(tmp_path):
+    cache = SynthesisCache(str(tmp_path), 1000)
+    for i in range(3):
+        cache.put(cache.key(f'word {i}', 'voice'), b'x' * 300)
+        wait_until_idle(cache)
+    cache.evict(only_if_over=True)
+    assert cache.stats()['evictions'] == 0
+
+
+def test_put_over_the_limit_evicts_in_the_background_once(tmp_path):
+    cache = SynthesisCache(str(tmp_path), 1000)
+    cache.put(cache.key('first', 'voice'), b'x' * 300)
+    wait_until_idle(cache)
+    # an eviction already running: puts over the limit do not start another
+    cache._evicting = True
+    for i in range(4):
+        cache.put(cache.key(f'word {i}', 'voice'), b'x' * 300)
+    assert cache.stats()['evictions'] == 0
+    cache._evicting = False
+
+    cache.put(cache.key('last', 'voice'), b'x' * 300)
+    wait_until_idle(cache)
+    stats = cache.stats()
+    assert stats['evictions'] > 0 and stats['approx_bytes'] <= 900
+
+
+def test_reexporting_an_unchanged_deck_does_not_contact_tts(backend, client, monkeypatch, tmp_path):
+    monkeypatch.setattr(backend, 'tts_cache', SynthesisCache(str(tmp_path), 64 * 1024 * 1024))
+    deck = deck_csv([('hello', 'salve'), ('goodbye', 'vale')])
+
+    def export():
+        r = client.post('/synthesize', data={'file': (io.BytesIO(deck), 'deck.csv')},
+                        content_type='multipart/form-data')
+        assert r.status_code == 200
+        return r.data
+
+    first = export()
+    calls = backend.tts_runtime.upstream.calls
+    assert calls == 4
+    assert export() == first
+    assert backend.tts_runtime.upstream.calls == calls
+    assert backend.tts_cache.stats()['hits'] == 4
+
+
+def test_encoded_outputs_do_not_count_as_synthesis_lookups(backend, client, monkeypatch, tmp_path):
+    import profiles
+
+    cache = SynthesisCache(str(tmp_path), 64 * 1024 * 1024)
+    monkeypatch.setattr(backend, 'tts_cache', cache)
+    clip = client.get('/synthesize_text?text=salve&lang=la').data
+    # stand in for ffmpeg: the encoded clip is already cached
+    speech = profiles.PRESETS['speech']
+    cache.put(profiles.cache_key(clip, speech), b'opus audio', profiles.extension(speech))
+
+    r = client.get('/synthesize_text?text=salve&lang=la&profile=speech')
+    assert r.data == b'opus audio' and r.mimetype == 'audio/ogg'
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
@@ -0,0 +1,275 @@
+import asyncio
+import io
+import threading
+import zipfile
+import time
+
+import pytest
+
+from conftest import deck_csv
+from tts_runtime import TTSRuntime
+from upstream import CLOSED, HALF_OPEN, OPEN, CircuitOpen, InputRejected, UpstreamController, is_transient
+
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f'HTTP {status}')
+        self.status = status
+
+
+def controller(**kwargs):
+    settings = dict(min_limit=1, retries=0, backoff_s=0.0, breaker_threshold=3,
+                    breaker_open_s=0.05, cooldown_s=0.0)
+    settings.update(kwargs)
+    return UpstreamController(10, **settings)
+
+
+async def ok():
+    return b'audio'
+
+
+async def boom():
+    raise ConnectionError('reset by peer')
+
+
+def run(ctrl, make_call):
+    async def _call():
+        return await ctrl.call(make_call)
+    return asyncio.run(_call())
+
+
+def fail(ctrl, times=1):
+    for _ in range(times):
+        with pytest.raises(ConnectionError):
+            run(ctrl, boom)
+
+
+def test_is_transient():
+    assert is_transient(ConnectionError())
+    assert is_transient(HTTPError(429))
+    assert is_transient(HTTPError(503))
+    assert not is_transient(HTTPError(400))
+    assert not is_transient(CircuitOpen())
+    assert not is_transient(InputRejected())
+
+
+def test_breaker_opens_after_threshold_and_rejects():
+    ctrl = controller()
+    fail(ctrl, 2)
+    assert ctrl.state == CLOSED
+    fail(ctrl)
+    assert ctrl.state == OPEN and ctrl.is_open()
+    assert ctrl.retry_after() > 0
+    with pytest.raises(CircuitOpen):
+        run(ctrl, ok)
+    assert ctrl.rejected == 1
+
+
+def test_half_open_probe_success_closes():
+    ctrl = controller()
+    fail(ctrl, 3)
+    time.sleep(0.06)
+    # the wait is over: the next call may go through as the probe
+    assert not ctrl.is_open()
+    assert run(ctrl, ok) == b'audio'
+    assert ctrl.state == CLOSED and ctrl.consecutive_failures == 0
+
+
+def test_half_open_probe_failure_reopens():
+    ctrl = controller()
+    fail(ctrl, 3)
+    time.sleep(0.06)
+    fail(ctrl)
+    assert ctrl.state == OPEN and ctrl.is_open()
+
+
+def test_half_open_lets_only_one_probe_through():
+    ctrl = controller()
+    fail(ctrl, 3)
+    time.sleep(0.06)
+
+    async def _race():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return b'audio'
+
+        probe = asyncio.ensure_future(ctrl.call(slow))
+        await asyncio.sleep(0)
+        assert ctrl.state == HALF_OPEN and ctrl.is_open()
+        with pytest.raises(CircuitOpen):
+            await ctrl.call(ok)
+        release.set()
+        return await probe
+
+    assert asyncio.run(_race()) == b'audio'
+    assert ctrl.state == CLOSED
+
+
+def test_transient_failure_is_retried():
+    ctrl = controller(retries=2)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError('reset by peer')
+        return b'audio'
+
+    assert run(ctrl, flaky) == b'audio'
+    assert len(attempts) == 2 and ctrl.retried == 1 and ctrl.failures == 1
+
+
+def test_client_error_is_not_retried():
+    ctrl = controller(retries=2)
+
+    async def bad_request():
+        raise HTTPError(400)
+
+    with pytest.raises(HTTPError):
+        run(ctrl, bad_request)
+    assert ctrl.retried == 0
+
+
+def test_rejected_input_does_not_count_against_upstream():
+    ctrl = controller(retries=2)
+
+    async def unspeakable():
+        raise InputRejected('no audio')
+
+    for _ in range(5):
+        with pytest.raises(InputRejected):
+            run(ctrl, unspeakable)
+    assert ctrl.state == CLOSED
+    assert ctrl.failures == 0 and ctrl.retried == 0 and ctrl.limit == 10
+
+
+def test_aimd_limit_shrinks_on_failure_and_grows_back():
+    ctrl = controller(breaker_threshold=100)
+    fail(ctrl)
+    assert ctrl.limit == pytest.approx(7.0)
+    fail(ctrl, 20)
+    assert ctrl.limit == 1.0
+    for _ in range(50):
+        run(ctrl, ok)
+    assert 1.0 < ctrl.limit <= 10
+
+
+def test_caller_after_a_cancelled_flight_starts_a_new_one():
+    runtime = TTSRuntime(4)
+
+    async def never():
+        await asyncio.sleep(10)
+
+    async def fresh():
+        return b'audio'
+
+    async def scenario():
+        first = asyncio.ensure_future(runtime.shared('key', never))
+        await asyncio.sleep(0)
+        first.cancel()
+        # let the only waiter cancel the flight, but not the flight unwind
+        await asyncio.sleep(0)
+        return await runtime.shared('key', fresh)
+
+    assert asyncio.run(scenario()) == b'audio'
+
+
+def test_get_synthesis_is_cacheable_and_revalidates_with_304(backend, client):
+    url = '/synthesize_text?text=salve&lang=la'
+    r = client.get(url)
+    assert r.status_code == 200 and r.mimetype == 'audio/mpeg'
+    etag = r.headers['ETag']
+    assert r.cache_control.max_age == backend.SPEECH_MAX_AGE
+
+    calls = backend.tts_runtime.upstream.calls
+    again = client.get(url, headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.headers['ETag'] == etag
+    assert again.cache_control.max_age == backend.SPEECH_MAX_AGE
+    assert backend.tts_runtime.upstream.calls == calls
+    # another voice is another resource
+    assert client.get(url + '&gender=male').headers['ETag'] != etag
+
+
+def test_identical_concurrent_requests_share_one_upstream_call(backend, monkeypatch):
+    # slow enough that every request arrives while the first is in flight
+    monkeypatch.setenv('FAKE_TTS_LATENCY_MS', '300')
+    coalesced = backend.tts_runtime.coalesced
+    barrier = threading.Barrier(8)
+    statuses = []
+
+    def fetch():
+        client = backend.app.test_client()
+        barrier.wait()
+        statuses.append(client.get('/synthesize_text?text=ave&lang=la').status_code)
+
+    threads = [threading.Thread(target=fetch) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert statuses == [200] * 8
+    assert backend.tts_runtime.upstream.calls == 1
+    assert backend.tts_runtime.coalesced - coalesced == 7
+
+
+def test_blank_cells_never_reach_upstream(backend, client):
+    # only failures should move the limit here, not the fake's timing jitter
+    backend.tts_runtime.upstream.latency_factor = float('inf')
+    deck = deck_csv([(f'word {i}', '') for i in range(5)])
+    r = client.post('/synthesize', data={'file': (io.BytesIO(deck), 'deck.csv'), 'output': 'zip'},
+                    content_type='multipart/form-data')
+    assert r.status_code == 200
+    # the body streams: reading it runs the synthesis
+    sizes = {info.filename: info.file_size for info in zipfile.ZipFile(io.BytesIO(r.data)).infolist()}
+    assert sizes['row001_back.mp3'] == 0 and sizes['row001_front.mp3'] > 0
+    stats = backend.tts_runtime.upstream.stats()
+    assert stats['calls'] == 5 and stats['failures'] == 0
+    assert stats['limit'] == stats['max_limit']
+
+
+def test_blank_cells_are_silence_not_degraded_segments(backend, client):
+    deck = deck_csv([(f'word {i}', '') for i in range(5)])
+    r = client.post('/synthesize', data={'file': (io.BytesIO(deck), 'deck.csv')},
+                    content_type='multipart/form-data')
+    assert r.status_code == 200
+    assert r.headers['X-Degraded-Segments'] == '0'
+
+    segments = [{'text': 'salve', 'lang': 'la'}, {'text': '   ', 'lang': 'la'}]
+    r = client.post('/synthesize_combined', json={'segments': segments})
+    assert r.status_code == 200
+    assert r.headers['X-Degraded-Segments'] == '0'
+
+
+def open_breaker(backend):
+    ctrl = backend.tts_runtime.upstream
+    ctrl.state = OPEN
+    ctrl._opened_at = time.monotonic()
+
+
+def test_batch_export_returns_503_while_open(backend, client):
+    open_breaker(backend)
+    deck = deck_csv([('hello', 'salve')])
+    r = client.post('/synthesize', data={'file': (io.BytesIO(deck), 'deck.csv')},
+                    content_type='multipart/form-data')
+    assert r.status_code == 503
+    assert int(r.headers['Retry-After']) >= 1
+    assert 'X-Degraded-Segments' not in r.headers
+
+
+@pytest.mark.parametrize('path, fields', [
+    ('/synthesize', {'output': 'zip'}),
+    ('/sprites', {}),
+])
+def test_deck_streams_return_503_while_open(backend, client, path, fields):
+    open_breaker(backend)
+    data = dict(fields, file=(io.BytesIO(deck_csv([('hello', 'salve')])), 'deck.csv'))
+    r = client.post(path, data=data, content_type='multipart/form-data')
+    assert r.status_code == 503
+
+
+def test_combined_stream_returns_503_while_open(backend, client):
+    open_breaker(backend)
+    r = client.post('/synthesize_combined/stream', json={'segments': [{'text': 'salve', 'lang': 'la'}]})
+    assert r.status_code == 503
@@ -0,0 +1,68 @@
+import io
+import json
+import zipfile
+
+from conftest import deck_csv
+from fake_tts import fake_mp3
+from zipstream import ZipStream
+
+
+def test_zipstream_is_readable_and_drains_per_entry():
+    archive = ZipStream()
+    chunks = []
+    for name, data in [('a.mp3', fake_mp3('salve')), ('empty.mp3', b''), ('b.mp3', fake_mp3('vale'))]:
+        archive.add(name, data)
+        chunks.append(archive.drain())
+    archive.close()
+    chunks.append(archive.drain())
+
+    # every entry is on the wire as soon as it is added
+    assert all(chunks[:3])
+    zf = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+    assert zf.testzip() is None
+    assert zf.namelist() == ['a.mp3', 'empty.mp3', 'b.mp3']
+    assert zf.read('b.mp3') == fake_mp3('vale')
+    assert all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist())
+
+
+def test_rows_zip_export_streams_a_valid_archive(client):
+    deck = deck_csv([('hello', 'salve'), ('', 'vale'), ('goodbye', 'ave')])
+    r = client.post('/synthesize', data={'file': (io.BytesIO(deck), 'deck.csv'), 'output': 'zip'},
+                    content_type='multipart/form-data')
+    assert r.status_code == 200 and r.mimetype == 'application/zip'
+    assert r.content_length is None
+    chunks = [chunk for chunk in r.response if chunk]
+    # one chunk per row plus the central directory
+    assert len(chunks) == 4
+
+    zf = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+    assert zf.testzip() is None
+    assert zf.namelist() == [f'row{i:03d}_{side}.mp3' for i in (1, 2, 3) for side in ('front', 'back')]
+    assert zf.read('row001_back.mp3') == fake_mp3('salve')
+    # a blank cell becomes an empty entry
+    assert zf.read('row002_front.mp3') == b''
+
+
+def test_rows_zip_without_any_way_to_join(backend, client, monkeypatch):
+    monkeypatch.setattr(backend, 'MP3_FRAME_JOIN', False)
+    monkeypatch.setattr(backend, 'load_pydub', lambda: None)
+    deck = deck_csv([('hello', 'salve')])
+    r = client.post('/synthesize', data={'file': (io.BytesIO(deck), 'deck.csv')},
+                    content_type='multipart/form-data')
+    assert r.status_code == 200
+    assert zipfile.ZipFile(io.BytesIO(r.data)).testzip() is None
+
+
+def test_rows_zip_reports_failed_clips_in_a_trailing_entry(backend, client, monkeypatch):
+    monkeypatch.setenv('FAKE_TTS_FAILURE_RATE', '1')
+    deck = deck_csv([('hello', ''), ('goodbye', 'vale')])
+    r = client.post('/synthesize', data={'file': (io.BytesIO(deck), 'deck.csv'), 'output': 'zip'},
+                    content_type='multipart/form-data')
+    assert r.status_code == 200
+    zf = zipfile.ZipFile(io.BytesIO(r.data))
+    assert zf.namelist()[-1] == 'degraded.json'
+    # the blank cell is not a failure
+    assert json.loads(zf.read('degraded.json')) == {
+        'degraded_segments': 3,
+        'files': ['row001_front.mp3', 'row002_front.mp3', 'row002_back.mp3'],
+    }
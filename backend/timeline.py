@@ -0,0 +1,86 @@
+"""Linear-time PCM assembly for exported decks.
+
+`out += segment` on an AudioSegment copies the whole accumulated buffer each
+time, so building a long deck that way is quadratic. `Timeline` instead
+records the pieces in order, lays them out as (offset, buffer) entries and
+renders them into a single preallocated buffer, writing every decoded
+piece exactly once. Silence costs nothing beyond advancing the
+offset.
+"""
+
+# pydub's AudioSegment.silent() defaults, used when a timeline has no audio
+DEFAULT_FRAME_RATE = 11025
+DEFAULT_CHANNELS = 1
+DEFAULT_SAMPLE_WIDTH = 2
+
+
+class Timeline:
+    def __init__(self):
+        # pieces in playback order: an int is a silence gap in ms, anything
+        # else is a decoded AudioSegment
+        self._pieces = []
+        self._duration_ms = 0
+
+    @property
+    def duration_ms(self):
+        return self._duration_ms
+
+    def add_silence(self, duration_ms):
+        duration_ms = max(0, int(duration_ms))
+        self._pieces.append(duration_ms)
+        self._duration_ms += duration_ms
+
+    def add_audio(self, segment):
+        self._pieces.append(segment)
+        self._duration_ms += len(segment)
+
+    def _target_format(self):
+        # match AudioSegment's own _sync(): the highest rate/channels/width wins
+        segments = [p for p in self._pieces if not isinstance(p, int)]
+        return (
+            max([s.frame_rate for s in segments] + [DEFAULT_FRAME_RATE]),
+            max([s.channels for s in segments] + [DEFAULT_CHANNELS]),
+            max([s.sample_width for s in segments] + [DEFAULT_SAMPLE_WIDTH]),
+        )
+
+    def render_raw(self):
+        """Return `(pcm, frame_rate, channels, sample_width)`; `pcm` is a bytearray.
+
+        The timeline is consumed: decoded pieces are released as they are
+        converted, and converted ones as they are written, so peak memory
+        stays near one copy of the output plus one piece.
+        """
+        frame_rate, channels, sample_width = self._target_format()
+        frame_width = channels * sample_width
+
+        # pass 1: convert audio to the target format and lay out offsets
+        entries = []
+        total_frames = 0
+        pieces, self._pieces = self._pieces, []
+        for i, piece in enumerate(pieces):
+            pieces[i] = None
+            if isinstance(piece, int):
+                total_frames += int(piece * frame_rate / 1000)
+                continue
+            raw = (piece.set_frame_rate(frame_rate)
+                        .set_channels(channels)
+                        .set_sample_width(sample_width)).raw_data
+            entries.append((total_frames * frame_width, raw))
+            total_frames += len(raw) // frame_width
+
+        # pass 2: one allocation, each piece written once
+        # 8-bit PCM is unsigned, so its silence is 0x80 rather than zero
+        size = total_frames * frame_width
+        buf = bytearray(b'\x80') * size if sample_width == 1 else bytearray(size)
+        for i, (offset, raw) in enumerate(entries):
+            entries[i] = None
+            buf[offset:offset + len(raw)] = raw
+        self._duration_ms = 0
+        return buf, frame_rate, channels, sample_width
+
+    def render(self):
+        """Render the timeline to a single AudioSegment backed by the rendered buffer."""
+        from pydub import AudioSegment
+        data, frame_rate, channels, sample_width = self.render_raw()
+        return AudioSegment(data=data, sample_width=sample_width,
+                            frame_rate=frame_rate, channels=channels)
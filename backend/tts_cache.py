@@ -0,0 +1,181 @@
+"""Disk-backed, content-addressed cache for synthesized speech.
+
+Entries are keyed by a hash of the text, the resolved Edge voice and any
+synthesis parameters, so an unchanged deck re-exports without contacting
+the TTS service. Writes go through a temp file in the cache directory and
+`os.replace`, which keeps entries whole when several workers share the
+same directory. Reads bump the file mtime; eviction removes the oldest
+files first once the directory grows past `max_bytes`. Measuring and
+evicting walk the whole directory, so they run on a background thread
+rather than in the `put` that noticed the cache was full.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'imitatio-tts-cache')
+DEFAULT_CACHE_MAX_MB = 512
+
+
+class SynthesisCache:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._approx_bytes = None
+        self._evicting = False
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(text, voice, **params):
+        payload = json.dumps([text, voice, sorted(params.items())], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path_for(self, key, ext='mp3'):
+        return os.path.join(self.root, key[:2], f'{key}.{ext}')
+
+    def get(self, key, ext='mp3', count=True):
+        """Return cached bytes for `key`, or None on a miss.
+
+        With `count=False` the lookup is left out of the hit/miss counters,
+        which describe speech synthesis only.
+        """
+        if not self.enabled:
+            return None
+        path = self.path_for(key, ext)
+        try:
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            os.utime(path, None)
+        except OSError:
+            data = None
+        if count:
+            with self._lock:
+                if data:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return data or None
+
+    def contains(self, key, ext='mp3'):
+        """True if `key` is cached; does not count as a hit or miss."""
+        return self.enabled and os.path.exists(self.path_for(key, ext))
+
+    def put(self, key, data, ext='mp3'):
+        """Store `data` under `key` atomically; evicts in the background if over the limit."""
+        if not self.enabled or not data:
+            return
+        path = self.path_for(key, ext)
+        directory = os.path.dirname(path)
+        tmp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+            tmp_path = None
+        except OSError:
+            logging.exception('tts cache write failed')
+            return
+        finally:
+            if tmp_path:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+        with self._lock:
+            self.stores += 1
+            if self._approx_bytes is not None:
+                self._approx_bytes += len(data)
+            # the first store measures the directory, which may already be full
+            check = self._approx_bytes is None or self._approx_bytes > self.max_bytes
+            if check and not self._evicting:
+                self._evicting = True
+            else:
+                check = False
+        if check:
+            threading.Thread(target=self._evict_in_background, name='tts-cache-evict',
+                             daemon=True).start()
+
+    def _evict_in_background(self):
+        try:
+            self.evict(only_if_over=True)
+        except Exception:
+            logging.exception('tts cache eviction failed')
+        finally:
+            with self._lock:
+                self._evicting = False
+
+    def _entries(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith('.part'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self, only_if_over=False):
+        """Drop least recently used entries until usage is under 90% of the limit.
+
+        With `only_if_over`, nothing is removed unless usage exceeds the limit.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes if only_if_over and total <= self.max_bytes else int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                # another worker got there first
+                pass
+            except OSError:
+                continue
+            total -= size
+        with self._lock:
+            self.evictions += removed
+            self._approx_bytes = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'dir': self.root,
+                'max_bytes': self.max_bytes,
+                'approx_bytes': self._approx_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'stores': self.stores,
+                'evictions': self.evictions,
+            }
+
+
+def cache_from_env():
+    root = os.environ.get('TTS_CACHE_DIR', DEFAULT_CACHE_DIR)
+    try:
+        max_mb = float(os.environ.get('TTS_CACHE_MAX_MB', DEFAULT_CACHE_MAX_MB))
+    except ValueError:
+        max_mb = DEFAULT_CACHE_MAX_MB
+    return SynthesisCache(root, int(max_mb * 1024 * 1024))
@@ -0,0 +1,138 @@
+"""Process-wide event loop for upstream TTS calls.
+
+Request handlers hand their synthesis coroutines to one long-lived loop
+running in a daemon thread instead of creating (and tearing down) a
+loop per call with `asyncio.run`. All upstream calls share that loop, a
+global in-flight cap, and a pooled aiohttp connector (DNS cache and TLS
+context) that outlives the short-lived ClientSession edge-tts opens for
+each call. A blocked handler thread then costs only a waiting future.
+Because every call runs on that one loop, identical requests in flight
+at the same time can share a single upstream call (`shared`), and one
+`UpstreamController` sees every call to adapt concurrency, retry and
+trip its circuit breaker.
+"""
+import asyncio
+import logging
+import threading
+
+from upstream import UpstreamController
+
+
+def _shared_connector(limit):
+    """aiohttp connector that is not closed when a ClientSession using it closes."""
+    import aiohttp
+
+    class SharedConnector(aiohttp.TCPConnector):
+        def close(self, *args, **kwargs):
+            # ClientSession owns and closes its connector; keep ours alive
+            fut = asyncio.get_running_loop().create_future()
+            fut.set_result(None)
+            return fut
+
+        def shutdown(self):
+            return super().close()
+
+    return SharedConnector(limit=limit, ttl_dns_cache=300)
+
+
+class _Flight:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class TTSRuntime:
+    def __init__(self, max_in_flight, upstream=None):
+        self.max_in_flight = max(1, max_in_flight)
+        self.upstream = upstream or UpstreamController(self.max_in_flight)
+        self.coalesced = 0
+        self._flights = {}
+        self._loop = None
+        self._thread = None
+        self._connector = None
+        self._connector_tried = False
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=_run, name='tts-loop', daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+            return loop
+
+    def submit(self, coro):
+        """Schedule `coro` on the shared loop; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._start())
+
+    def run(self, coro, timeout=None):
+        """Run `coro` on the shared loop and block the calling thread for its result."""
+        return self.submit(coro).result(timeout)
+
+    @property
+    def in_flight(self):
+        return self.upstream.in_flight
+
+    async def call(self, make_call):
+        """Run `make_call(connector)` through the upstream controller.
+
+        Transient failures are retried; raises `upstream.CircuitOpen` when
+        the service is considered down.
+        """
+        return await self.upstream.call(lambda: make_call(self.connector()))
+
+    async def shared(self, key, make_coro):
+        """Await `make_coro()`, sharing one run among concurrent callers with the same `key`.
+
+        The run is only cancelled when every caller waiting on it has been
+        cancelled, so one client going away does not fail the others.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(make_coro()))
+
+            def _done(_task):
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+            flight.task.add_done_callback(_done)
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1:
+                flight.task.cancel()
+                # a caller arriving before the task unwinds must start afresh
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def connector(self):
+        # created lazily on the loop thread; None lets edge-tts use its own
+        if not self._connector_tried:
+            self._connector_tried = True
+            try:
+                self._connector = _shared_connector(self.max_in_flight)
+            except Exception:
+                logging.exception('shared TTS connector unavailable')
+        return self._connector
+
+    def stats(self):
+        return {'in_flight': self.in_flight, 'max_in_flight': self.max_in_flight,
+                'coalesced': self.coalesced, 'upstream': self.upstream.stats()}
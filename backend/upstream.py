@@ -0,0 +1,230 @@
+"""Adaptive control of upstream TTS calls.
+
+`UpstreamController` sits between request handlers and edge-tts on the
+shared TTS loop and does three things:
+
+- Concurrency: an AIMD limit between `min_limit` and `max_limit`. It
+  grows by about one slot per window of successful calls and shrinks by
+  a factor after a failure, or once latency has clearly risen above its
+  long-run baseline (the usual sign of throttling), at most once per
+  `cooldown_s`.
+- Retries: transient failures (connection errors, timeouts, 408/429/5xx,
+  empty audio) are retried with full-jitter exponential backoff. The
+  slot is released while waiting.
+- Circuit breaker: after `breaker_threshold` consecutive failed attempts
+  calls fail fast with `CircuitOpen` for `breaker_open_s`. Then a single
+  probe call is let through, which closes the breaker on success.
+
+A call that raises `InputRejected` failed because of what was asked, not
+because upstream is struggling: it is not retried and counts neither
+towards the limit nor the breaker.
+
+All methods must run on the loop that owns the controller.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    """Raised without contacting upstream while the breaker is open."""
+
+
+class InputRejected(Exception):
+    """Upstream cannot speak this input (e.g. blank or punctuation-only text)."""
+
+
+def is_transient(exc):
+    """False for errors a retry cannot fix (rejected input, 4xx other than 408/429)."""
+    if isinstance(exc, (CircuitOpen, InputRejected)):
+        return False
+    status = getattr(exc, 'status', None)
+    if isinstance(status, int) and 400 <= status < 500 and status not in (408, 429):
+        return False
+    return True
+
+
+class UpstreamController:
+    def __init__(self, max_limit, min_limit=1, retries=2, backoff_s=0.25, backoff_max_s=4.0,
+                 breaker_threshold=10, breaker_open_s=30.0, cooldown_s=1.0, latency_factor=2.0):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.retries = max(0, retries)
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self.breaker_threshold = max(1, breaker_threshold)
+        self.breaker_open_s = breaker_open_s
+        self.cooldown_s = cooldown_s
+        self.latency_factor = latency_factor
+
+        self.in_flight = 0
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.calls = 0
+        self.failures = 0
+        self.retried = 0
+        self.rejected = 0
+        self.latency_ewma = None
+        self.latency_baseline = None
+        self._opened_at = 0.0
+        self._probing = False
+        self._last_decrease = 0.0
+        self._cond = None
+
+    async def call(self, make_call):
+        """Await `make_call()` under the adaptive limit, retrying transient failures."""
+        attempt = 0
+        while True:
+            probe = self._check_breaker()
+            try:
+                await self._acquire()
+            except asyncio.CancelledError:
+                if probe:
+                    self._probing = False
+                raise
+            started = time.monotonic()
+            try:
+                result = await make_call()
+            except asyncio.CancelledError:
+                if probe:
+                    self._probing = False
+                raise
+            except InputRejected:
+                # says nothing about upstream health; a probe stays undecided
+                if probe:
+                    self._probing = False
+                raise
+            except Exception as exc:
+                self._on_failure(probe)
+                if attempt >= self.retries or not is_transient(exc) or self.state != CLOSED:
+                    raise
+                attempt += 1
+                self.retried += 1
+                logging.warning(f'upstream TTS attempt {attempt} failed ({exc!r}); retrying')
+            else:
+                self._on_success(time.monotonic() - started)
+                return result
+            finally:
+                await self._release()
+            # full jitter: spread retries out so they do not arrive together
+            await asyncio.sleep(random.uniform(0, min(self.backoff_max_s, self.backoff_s * 2 ** attempt)))
+
+    def _check_breaker(self):
+        """Raise `CircuitOpen`, or return True if this call is the half-open probe."""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.breaker_open_s:
+                self.rejected += 1
+                raise CircuitOpen('upstream TTS circuit is open')
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            # one probe at a time decides whether the service is back
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpen('upstream TTS circuit is half open')
+            self._probing = True
+            return True
+        return False
+
+    async def _acquire(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def _release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _on_success(self, elapsed):
+        self.calls += 1
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            logging.info('upstream TTS circuit closed')
+            self.state = CLOSED
+        self._probing = False
+
+        if self.latency_baseline is None:
+            self.latency_baseline = self.latency_ewma = elapsed
+        else:
+            self.latency_ewma += 0.2 * (elapsed - self.latency_ewma)
+            self.latency_baseline += 0.02 * (elapsed - self.latency_baseline)
+        if self.latency_ewma > self.latency_factor * self.latency_baseline:
+            self._decrease()
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def _on_failure(self, probe=False):
+        self.calls += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        if probe:
+            self._probing = False
+        self._decrease()
+        if (self.state == HALF_OPEN and probe) or (self.state == CLOSED
+                                       and self.consecutive_failures >= self.breaker_threshold):
+            logging.warning(f'upstream TTS circuit open after {self.consecutive_failures} failures')
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown_s:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * 0.7)
+
+    def is_open(self):
+        """True while a call would be rejected without contacting upstream.
+
+        An open breaker whose wait is over counts as closed, so the next
+        call can go through as the probe.
+        """
+        if self.state == OPEN:
+            return time.monotonic() - self._opened_at < self.breaker_open_s
+        return self.state == HALF_OPEN and self._probing
+
+    def retry_after(self):
+        """Seconds until the breaker lets a probe through (0 when closed)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.breaker_open_s - (time.monotonic() - self._opened_at))
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'limit': int(self.limit),
+            'max_limit': self.max_limit,
+            'in_flight': self.in_flight,
+            'calls': self.calls,
+            'failures': self.failures,
+            'retried': self.retried,
+            'rejected': self.rejected,
+            'latency_ewma_ms': round(self.latency_ewma * 1000, 1) if self.latency_ewma else None,
+            'latency_baseline_ms': round(self.latency_baseline * 1000, 1) if self.latency_baseline else None,
+        }
+
+
+def upstream_from_env(max_limit):
+    def setting(name, default):
+        try:
+            return type(default)(os.environ.get(name, default))
+        except ValueError:
+            return default
+
+    return UpstreamController(
+        max_limit,
+        min_limit=setting('TTS_MIN_IN_FLIGHT', 2),
+        retries=setting('TTS_RETRIES', 2),
+        backoff_s=setting('TTS_BACKOFF_MS', 250) / 1000.0,
+        breaker_threshold=setting('TTS_BREAKER_THRESHOLD', 10),
+        breaker_open_s=setting('TTS_BREAKER_OPEN_S', 30.0),
+    )
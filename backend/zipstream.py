@@ -0,0 +1,55 @@
+"""Incremental ZIP writer for streaming responses.
+
+`zipfile` writes to unseekable outputs by putting each entry's CRC and
+sizes in a data descriptor after its data. `ZipStream` gives it such an
+output and hands back the bytes produced so far with `drain()`, so each
+entry can be sent to the client as soon as it is added. Entries are
+stored uncompressed because MP3 does not compress further.
+"""
+import io
+import time
+import zipfile
+
+
+class _Sink(io.RawIOBase):
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return self._pos
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ZipStream:
+    def __init__(self):
+        self._sink = _Sink()
+        self._zf = zipfile.ZipFile(self._sink, 'w', compression=zipfile.ZIP_STORED)
+
+    def add(self, name, data):
+        zinfo = zipfile.ZipInfo(name, date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = zipfile.ZIP_STORED
+        self._zf.writestr(zinfo, data)
+
+    def close(self):
+        """Write the central directory."""
+        self._zf.close()
+
+    def drain(self):
+        """Return the bytes written since the previous call."""
+        return self._sink.pop()
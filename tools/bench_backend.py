@@ -0,0 +1,247 @@
+"""Benchmark the Flask backend against the offline fake TTS provider.
+
+Drives /synthesize, /synthesize_text and /synthesize_combined in-process
+through Flask's test client. Synthesis goes through backend/fake_tts.py,
+so runs never contact Microsoft's service and are reproducible. Reports
+rows/sec, p50/p99 request latency, peak RSS and peak temp-disk usage as
+JSON, so results can be compared between releases, plus the cold-start
+import time of app.py against STARTUP_TARGET_MS.
+
+Usage:
+  python tools/bench_backend.py --rows 10 100 1000 --out bench.json
+  python tools/bench_backend.py --rows 10000 --latency-ms 50 --endpoints synthesize
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, 'backend')
+
+ENDPOINTS = ('synthesize', 'synthesize_text', 'synthesize_combined')
+# Cold start budget: a fresh interpreter importing backend/app.py. Heavy
+# dependencies (pydub, edge-tts) load on first use, so this stays
+# well below the ~800 ms it took when they were imported eagerly.
+STARTUP_TARGET_MS = 500
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # ru_maxrss is KB on Linux, bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def dir_bytes(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class Sampler:
+    """Track peak RSS and peak temp-dir size while a scenario runs."""
+
+    def __init__(self, tmp_dir, interval=0.05):
+        self.tmp_dir = tmp_dir
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_tmp = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        self.peak_rss = max(self.peak_rss, rss_bytes())
+        self.peak_tmp = max(self.peak_tmp, dir_bytes(self.tmp_dir))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def make_deck(rows):
+    lines = ['english,latin']
+    for i in range(rows):
+        lines.append(f'the farmer sees the road {i},agricola viam videt {i}')
+    return '\n'.join(lines).encode('utf-8') + b'\n'
+
+
+def make_segments(rows):
+    segments = []
+    for i in range(rows):
+        segments.append({'text': f'the farmer sees the road {i}', 'lang': 'en'})
+        segments.append({'text': f'agricola viam videt {i}', 'lang': 'la', 'is_row_boundary': True})
+    return segments
+
+
+def run_requests(client, endpoint, rows, repeat):
+    latencies = []
+    for _ in range(repeat):
+        if endpoint == 'synthesize':
+            start = time.perf_counter()
+            resp = client.post('/synthesize', data={'file': (io.BytesIO(make_deck(rows)), 'deck.csv')},
+                               content_type='multipart/form-data')
+        elif endpoint == 'synthesize_combined':
+            start = time.perf_counter()
+            resp = client.post('/synthesize_combined', json={'segments': make_segments(rows)})
+        else:
+            # one request per row, as the React app does when playing items
+            for i in range(rows):
+                start = time.perf_counter()
+                resp = client.post('/synthesize_text', json={'text': f'agricola viam videt {i}', 'lang': 'la'})
+                resp.get_data()
+                if resp.status_code != 200:
+                    raise RuntimeError(f'/synthesize_text returned {resp.status_code}')
+                latencies.append(time.perf_counter() - start)
+            continue
+        body = resp.get_data()
+        if resp.status_code != 200:
+            raise RuntimeError(f'/{endpoint} returned {resp.status_code}: {body[:200]!r}')
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def measure_startup(runs):
+    """Median wall time (ms) for a new interpreter to import the backend."""
+    times = []
+    env = dict(os.environ, TTS_PROVIDER='')
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import app'], cwd=BACKEND, env=env,
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return percentile(times, 50)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000],
+                        help='deck sizes to run (default: 10 100 1000)')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--repeat', type=int, default=3, help='requests per deck export scenario')
+    parser.add_argument('--latency-ms', type=float, default=150, help='fake TTS latency per call')
+    parser.add_argument('--ms-per-char', type=float, default=60, help='fake speech length per character')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of fake TTS calls that fail')
+    parser.add_argument('--transient-rate', type=float, default=0.0,
+                        help='fraction of fake TTS calls that fail at random (exercises retries)')
+    parser.add_argument('--cache', action='store_true', help='keep the synthesis cache enabled')
+    parser.add_argument('--startup-runs', type=int, default=5, help='cold imports timed for the startup check')
+    parser.add_argument('--out', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    startup_ms = measure_startup(args.startup_runs) if args.startup_runs > 0 else None
+    work_dir = tempfile.mkdtemp(prefix='imitatio-bench-')
+    tmp_dir = os.path.join(work_dir, 'tmp')
+    os.makedirs(tmp_dir)
+    os.environ.update({
+        'TTS_PROVIDER': 'fake',
+        'FAKE_TTS_LATENCY_MS': str(args.latency_ms),
+        'FAKE_TTS_MS_PER_CHAR': str(args.ms_per_char),
+        'FAKE_TTS_FAILURE_RATE': str(args.failure_rate),
+        'FAKE_TTS_TRANSIENT_RATE': str(args.transient_rate),
+        'TTS_CACHE_DIR': os.path.join(work_dir, 'cache'),
+        'TTS_CACHE_MAX_MB': os.environ.get('TTS_CACHE_MAX_MB', '512') if args.cache else '0',
+        'EXPORT_JOBS_DIR': os.path.join(work_dir, 'jobs'),
+        'TMPDIR': tmp_dir,
+    })
+    tempfile.tempdir = tmp_dir
+    sys.path.insert(0, BACKEND)
+    import logging
+    logging.disable(logging.WARNING)
+    import app as backend
+
+    client = backend.app.test_client()
+    results = []
+    try:
+        for endpoint in args.endpoints:
+            for rows in args.rows:
+                repeat = 1 if endpoint == 'synthesize_text' else args.repeat
+                tmp_before = dir_bytes(tmp_dir)
+                with Sampler(tmp_dir) as sampler:
+                    start = time.perf_counter()
+                    latencies = run_requests(client, endpoint, rows, repeat)
+                    elapsed = time.perf_counter() - start
+                results.append({
+                    'endpoint': f'/{endpoint}',
+                    'rows': rows,
+                    'requests': len(latencies),
+                    'rows_per_sec': round(rows * repeat / elapsed, 2) if elapsed else None,
+                    'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                    'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+                    'peak_rss_mb': round(sampler.peak_rss / 2 ** 20, 2),
+                    # temp usage is relative to what earlier scenarios left behind
+                    'peak_tmp_mb': round((sampler.peak_tmp - tmp_before) / 2 ** 20, 3),
+                    'residual_tmp_mb': round((dir_bytes(tmp_dir) - tmp_before) / 2 ** 20, 3),
+                })
+                print(json.dumps(results[-1]), file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'config': vars(args),
+        },
+        'startup': {
+            'p50_ms': round(startup_ms, 1) if startup_ms is not None else None,
+            'target_ms': STARTUP_TARGET_MS,
+            'within_target': startup_ms is not None and startup_ms <= STARTUP_TARGET_MS,
+        },
+        'results': results,
+        'upstream': backend.tts_runtime.upstream.stats(),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fh:
+            fh.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
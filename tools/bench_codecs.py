@@ -0,0 +1,120 @@
+"""Compare output encoding profiles by size per minute and encode time.
+
+Encodes one MP3 source with every preset in backend/profiles.py and a few
+reference profiles, using the same ffmpeg invocation as the backend. The
+source defaults to a generated speech-like test signal (harmonic voice
+with pitch movement, syllable envelope, fricative noise and pauses)
+stored in Edge's native 24 kHz / 48 kbps mono MP3. Pass `--input` with a
+real export (e.g. a combined.mp3 from /synthesize) for numbers on actual
+speech. Results are JSON.
+
+Usage:
+  python tools/bench_codecs.py
+  python tools/bench_codecs.py --input combined.mp3 --runs 5 --out codecs.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+import profiles  # noqa: E402
+
+REFERENCE = {
+    'opus-24k': profiles.Profile('opus', 24, 24000, True),
+    'mp3-64k-stereo-44k': profiles.Profile('mp3', 64, 44100, False),
+    'aac-48k': profiles.Profile('aac', 48, 24000, True),
+}
+
+# voiced harmonics around a moving 150 Hz pitch, ~4 syllables/s, a pause
+# every 3 s and bursts of noise standing in for fricatives
+SPEECH_LIKE = (
+    "(0.5*sin(2*PI*(150*t+20*sin(PI*t)))+0.3*sin(4*PI*(150*t+20*sin(PI*t)))"
+    "+0.2*sin(6*PI*(150*t+20*sin(PI*t)))+0.12*sin(10*PI*(150*t+20*sin(PI*t)))"
+    "+0.06*sin(16*PI*(150*t+20*sin(PI*t)))+0.25*(random(0)-0.5)*gt(sin(2*PI*1.3*t),0.7))"
+    "*pow(abs(sin(2*PI*2*t)),1.5)*gt(mod(t,3),0.5)*0.6"
+)
+
+
+def ffmpeg_exe():
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return 'ffmpeg'
+
+
+def test_signal(ffmpeg, seconds):
+    """Speech-like signal encoded as Edge's native MP3."""
+    cmd = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+           '-i', f"aevalsrc='{SPEECH_LIKE}':s=24000:d={seconds}",
+           '-c:a', 'libmp3lame', '-b:a', '48k', '-ac', '1', '-f', 'mp3', 'pipe:1']
+    return subprocess.run(cmd, stdout=subprocess.PIPE, check=True).stdout
+
+
+def duration_s(ffmpeg, data):
+    """Decode `data` to count its samples (ffprobe is not always installed)."""
+    cmd = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0',
+           '-f', 's16le', '-ac', '1', '-ar', '8000', 'pipe:1']
+    pcm = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, check=True).stdout
+    return len(pcm) / 2 / 8000.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--input', help='MP3 to encode (default: generated test signal)')
+    parser.add_argument('--seconds', type=float, default=120, help='length of the generated signal')
+    parser.add_argument('--runs', type=int, default=3, help='encodes per profile; the median is reported')
+    parser.add_argument('--out', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    ffmpeg = ffmpeg_exe()
+    if args.input:
+        with open(args.input, 'rb') as fh:
+            source = fh.read()
+    else:
+        source = test_signal(ffmpeg, args.seconds)
+    minutes = duration_s(ffmpeg, source) / 60.0
+
+    results = [{
+        'profile': 'native',
+        'codec': 'mp3', 'bitrate_kbps': 48, 'sample_rate': 24000, 'mono': True,
+        'kb_per_minute': round(len(source) / 1024 / minutes, 1),
+        'size_vs_native': 1.0,
+        'encode_ms_per_minute': 0.0,
+    }]
+    for name, profile in list(profiles.PRESETS.items()) + list(REFERENCE.items()):
+        timings = []
+        for _ in range(max(1, args.runs)):
+            start = time.perf_counter()
+            data = profiles.transcode(source, profile, ffmpeg)
+            timings.append(time.perf_counter() - start)
+        results.append({
+            'profile': name,
+            'codec': profile.codec, 'bitrate_kbps': profile.bitrate,
+            'sample_rate': profile.sample_rate, 'mono': profile.mono,
+            'kb_per_minute': round(len(data) / 1024 / minutes, 1),
+            'size_vs_native': round(len(data) / len(source), 3),
+            'encode_ms_per_minute': round(statistics.median(timings) * 1000 / minutes, 1),
+        })
+        print(json.dumps(results[-1]), file=sys.stderr)
+
+    text = json.dumps({
+        'source': args.input or f'generated speech-like signal, {args.seconds:g} s',
+        'source_minutes': round(minutes, 2),
+        'results': results,
+    }, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fh:
+            fh.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Compile a CSV deck into an audio sprite plus a JSON offset index.
+
+Writes `<sprite_id>.mp3` and `<sprite_id>.json` into the output
+directory (by default the backend's SPRITES_DIR), using the same
+synthesis pipeline and cache as the backend. Serve the directory with
+the backend (`GET /sprites/<id>.mp3` supports Range requests) or any
+static host that honours Range.
+
+Usage:
+  python tools/compile_deck.py backend/sample.csv --lang-back la
+  python tools/compile_deck.py deck.csv --out-dir dist/sprites --gender male
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('csv', help='deck with front/back columns (e.g. english,latin)')
+    parser.add_argument('--out-dir', help='where to write the sprite (default: SPRITES_DIR)')
+    parser.add_argument('--lang-front', default='en')
+    parser.add_argument('--lang-back', default='la')
+    parser.add_argument('--gender', default=None, help='female or male (default: DEFAULT_VOICE_GENDER)')
+    args = parser.parse_args(argv)
+
+    import app as backend
+    from deck import iter_deck
+    from sprites import SpriteStore, degraded_items
+    from upstream import CircuitOpen
+
+    form = {'language_for_front': args.lang_front, 'language_for_back': args.lang_back}
+    if args.gender:
+        form['voice_gender'] = args.gender
+    opts = backend.export_options(form)
+    # an explicit output directory is the caller's to manage: never evict from it
+    store = SpriteStore(args.out_dir, max_bytes=0) if args.out_dir else backend.sprite_store
+    with open(args.csv, 'rb') as fh:
+        texts = list(iter_deck(fh))
+    try:
+        index = backend.compile_deck_sprite(texts, opts, store)
+    except CircuitOpen:
+        # same condition POST /sprites answers with 503
+        retry = max(1, int(backend.tts_runtime.upstream.retry_after()))
+        sys.exit(f'speech service unavailable, try again in {retry}s')
+    mp3_path, index_path = store.paths(index['sprite_id'])
+    print(json.dumps({
+        'sprite': mp3_path,
+        'index': index_path,
+        'items': len(index['items']),
+        'failed_clips': degraded_items(index),
+        'duration_ms': index['duration_ms'],
+        'byte_length': index['byte_length'],
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -394,8 +394,9 @@ export default function App() {
   async function synthesizeAndPlay(text, lang = 'en', gender = 'female') {
     if (!synthUrl) { alert('No backend configured for server-side playback.'); return; }
     try {
-      const payload = { text: String(text || ''), lang, gender };
-      const res = await fetch(synthUrl, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) });
+      // GET so the browser and CDN can cache samples the whole class plays
+      const params = new URLSearchParams({ text: String(text || ''), lang: lang || 'en', gender: gender || 'female' });
+      const res = await fetch(synthUrl + '?' + params.toString());
       if (!res.ok) throw new Error('Synthesis failed: ' + res.statusText);
       const ab = await res.arrayBuffer();
       const blob = new Blob([ab], { type: 'audio/mpeg' });